@@ -35,7 +35,11 @@ DEBUG = True
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'oauth2_provider.contrib.rest_framework.OAuth2Authentication',
+        'sportscenters.authentication.RoleOAuth2Authentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'sportscenters.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ),
 }
 
@@ -167,8 +171,50 @@ CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'unique-snowflake',
-    }
+    },
+    # Cache thống kê dùng chung giữa các worker và giữ được qua restart.
+    # Khóa single-flight của cached_stats cần add nguyên tử: với FileBasedCache khóa là file
+    # O_EXCL nên chỉ đúng khi mọi worker chạy trên cùng một máy. Chạy nhiều máy thì phải đổi sang
+    # 'django.core.cache.backends.redis.RedisCache' (LOCATION 'redis://...'), memcached
+    # hoặc 'django.core.cache.backends.db.DatabaseCache' (chạy `manage.py createcachetable`).
+    'stats': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'stats',
+        'TIMEOUT': None,
+    },
+    # Dữ liệu xác thực (đối tượng theo vai trò của user...), đọc ở mọi request
+    'auth': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'auth',
+        'TIMEOUT': 3600,
+    },
 }
+STATS_CACHE_ALIAS = 'stats'
+# Sau soft TTL kết quả được tính lại (một worker), sau hard TTL thì bị xóa hẳn
+STATS_CACHE_SOFT_TTL = 3600
+STATS_CACHE_HARD_TTL = 24 * 3600
+STATS_CACHE_LOCK_TIMEOUT = 60
+# Bộ đếm thông báo chưa đọc cần incr/decr nguyên tử dùng chung giữa các worker: thêm vào CACHES
+#     'counters': {
+#         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#         'LOCATION': 'redis://127.0.0.1:6379/1',
+#         'TIMEOUT': 3600,
+#     },
+# rồi đặt COUNTERS_CACHE_ALIAS = 'counters'. FileBasedCache/DatabaseCache/LocMemCache không dùng
+# được (incr là đọc rồi ghi, hoặc không dùng chung); để None thì badge đếm trực tiếp bằng index.
+COUNTERS_CACHE_ALIAS = None
+AUTH_CACHE_ALIAS = 'auth'
+# Thời gian cache tối đa khi không biết hạn của token
+AUTH_CACHE_TIMEOUT = 3600
+# Cache kết quả kiểm tra access token OAuth2 (tắt để so sánh trong benchmark_auth)
+AUTH_TOKEN_CACHE = True
+
+# Số ngày giữ Tombstone cho ?since=; client có since cũ hơn phải đồng bộ lại toàn bộ
+SYNC_TOMBSTONE_DAYS = 90
+
+# Số luồng chạy việc nền (export, gửi thông báo hàng loạt) trong mỗi process web
+BACKGROUND_WORKERS = 2
+EXPORT_ROWS_PER_FILE = 100_000
 
 
 CORS_ALLOW_CREDENTIALS = True
@@ -1,16 +1,46 @@
 from django.contrib import admin
-from sportscenters.models import Trainer, Class, Payment, Enrollment, Progress, Appointment, InternalNews, Notification, User, Member, Receptionist, Statistic
+from django.contrib.admin.exceptions import DisallowedModelAdminLookup
+from django.contrib.admin.views.main import ERROR_FLAG, IGNORED_PARAMS, PAGE_VAR, SEARCH_VAR
+from sportscenters.models import Trainer, Class, Payment, Enrollment, Progress, Appointment, InternalNews, Notification, User, Member, Receptionist, Statistic, ExportJob
 from django import forms
 from django.utils.safestring import mark_safe
-from django.http import HttpResponse
-import csv
 from django.shortcuts import render
 from django.urls import path
 from .views import StatisticViewSet
+from .exports import ENROLLMENT_EXPORT, STATISTIC_EXPORT, PAYMENT_EXPORT, MEMBER_EXPORT, enqueue_export
 from datetime import datetime, timedelta
 from django.utils import timezone
 
 
+def background_export(kind):
+    """
+    Action admin tạo job export nền cho các dòng đã chọn (dùng cho bảng rất lớn).
+    """
+    def export(modeladmin, request, queryset):
+        if request.POST.get('select_across') == '1':
+            # "Chọn tất cả": lưu bộ lọc/từ khóa của changelist, worker dựng lại queryset
+            filters = {
+                key: values for key, values in request.GET.lists()
+                if key not in (*IGNORED_PARAMS, PAGE_VAR, ERROR_FLAG)
+            }
+            for key, values in filters.items():
+                if not all(modeladmin.lookup_allowed(key, value, request) for value in values):
+                    raise DisallowedModelAdminLookup(f"Filtering by {key} not allowed")
+            params = {
+                'filters': filters,
+                'search': request.GET.get(SEARCH_VAR, ''),
+                'search_fields': list(modeladmin.get_search_fields(request)),
+            }
+        else:
+            # Chọn tay chỉ được trong một trang changelist (tối đa list_per_page dòng)
+            params = {'pks': list(queryset.values_list('pk', flat=True))}
+        job = enqueue_export(kind, params, request.user)
+        modeladmin.message_user(request, f"Đã tạo job export #{job.pk}, theo dõi tại mục Export jobs.")
+    export.__name__ = f'export_{kind}_in_background'
+    export.short_description = f"Export selected {kind} to CSV in background"
+    return export
+
+
 class UserForm(forms.ModelForm):
     password = forms.CharField(widget=forms.PasswordInput, required=False)
 
@@ -108,6 +138,13 @@ class MemberAdmin(BaseUserAdmin):
     def activate_members(self, request, queryset):
         queryset.update(is_active=True)
 
+    actions = ['export_members', background_export('members')]
+
+    def export_members(self, request, queryset):
+        return MEMBER_EXPORT.response(queryset)
+
+    export_members.short_description = "Export selected members to CSV"
+
 
 class TrainerAdmin(BaseUserAdmin):
     list_display = ('full_name', 'specialization', 'experience_years', 'active','avatar_view')
@@ -173,21 +210,10 @@ class EnrollmentAdmin(admin.ModelAdmin):
     list_filter = ('status', 'gym_class')
     search_fields = ('member__full_name', 'gym_class__name')
     ordering = ['-created_date']
-    actions = ['export_enrollments']
+    actions = ['export_enrollments', background_export('enrollments')]
 
     def export_enrollments(self, request, queryset):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="enrollments.csv"'
-        writer = csv.writer(response)
-        writer.writerow(['Member', 'Class', 'Status', 'Created Date'])
-        for enrollment in queryset:
-            writer.writerow([
-                enrollment.member.full_name,
-                enrollment.gym_class.name,
-                enrollment.status,
-                enrollment.created_date.date()
-            ])
-        return response
+        return ENROLLMENT_EXPORT.response(queryset)
 
     export_enrollments.short_description = "Export selected enrollments to CSV"
 
@@ -210,6 +236,12 @@ class PaymentAdmin(admin.ModelAdmin):
     list_filter = ('status', 'payment_method')
     search_fields = ('member__full_name', 'transaction_id')
     ordering = ['-date_paid']
+    actions = ['export_payments', background_export('payments')]
+
+    def export_payments(self, request, queryset):
+        return PAYMENT_EXPORT.response(queryset)
+
+    export_payments.short_description = "Export selected payments to CSV"
 
 class NotificationAdmin(admin.ModelAdmin):
     list_display = ('member', 'type', 'is_read', 'created_at')
@@ -225,26 +257,20 @@ class InternalNewsAdmin(admin.ModelAdmin):
 class StatisticAdmin(admin.ModelAdmin):
     list_display = ('period_type', 'period_start', 'period_end', 'member_count', 'total_revenue', 'attendance_rate')
     list_filter = ('period_type',)
-    actions = ['export_stats']
+    actions = ['export_stats', background_export('stats')]
 
     def export_stats(self, request, queryset):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="stats.csv"'
-        writer = csv.writer(response)
-        writer.writerow(['Period Type', 'Start Date', 'End Date', 'Members', 'Revenue', 'Attendance Rate'])
-        for stat in queryset:
-            writer.writerow([
-                stat.period_type,
-                stat.period_start,
-                stat.period_end,
-                stat.member_count,
-                stat.total_revenue,
-                stat.attendance_rate
-            ])
-        return response
+        return STATISTIC_EXPORT.response(queryset)
     export_stats.short_description = "Export selected statistics to CSV"
 
 
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'row_count', 'requested_by', 'created_date', 'finished_at')
+    list_filter = ('kind', 'status')
+    readonly_fields = ('files', 'row_count', 'error', 'finished_at')
+    ordering = ['-id']
+
+
 admin_site = MyAdminSite(name='myadmin')
 
 admin_site.register(User, UserAdmin)
@@ -258,4 +284,5 @@ admin_site.register(Appointment, AppointmentAdmin)
 admin_site.register(Payment, PaymentAdmin)
 admin_site.register(Notification, NotificationAdmin)
 admin_site.register(InternalNews, InternalNewsAdmin)
-admin_site.register(Statistic, StatisticAdmin)
\ No newline at end of file
+admin_site.register(Statistic, StatisticAdmin)
+admin_site.register(ExportJob, ExportJobAdmin)
\ No newline at end of file
@@ -0,0 +1,149 @@
+"""
+Lớp xác thực OAuth2 của API.
+
+Ngoài user, mỗi request còn được gắn `request.role_user`: đối tượng con của User theo
+vai trò (Member/Trainer/Receptionist, hoặc None với admin). Đối tượng này được đọc
+bằng một truy vấn rồi cache theo user (tối đa đến khi token hết hạn), nên các view
+theo vai trò không phải truy vấn lại bảng con ở mỗi request.
+
+Kết quả kiểm tra access token cũng được cache (khóa là SHA-256 của token, TTL không
+vượt quá hạn của token): request có token đã gặp không cần đọc bảng AccessToken và
+User. Cache bị xóa khi token bị thu hồi (/o/revoke_token/) hoặc user thay đổi.
+"""
+import hashlib
+from threading import Lock
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from oauth2_provider.contrib.rest_framework import OAuth2Authentication
+from sportscenters.models import Member, Trainer, Receptionist
+
+ROLE_MODELS = {
+    'member': Member,
+    'trainer': Trainer,
+    'receptionist': Receptionist,
+}
+
+
+def auth_cache():
+    return caches[settings.AUTH_CACHE_ALIAS]
+
+
+def role_cache_key(user_id):
+    return f'auth:role:{user_id}'
+
+
+TOKEN_METRICS_FLUSH_EVERY = 100
+
+# Đếm hit/miss trong process rồi cộng dồn vào cache theo lô, để mỗi request
+# không phải ghi thêm vào cache dùng chung
+_token_events = {'hits': 0, 'misses': 0}
+_token_events_lock = Lock()
+
+
+def _count_token_event(event):
+    with _token_events_lock:
+        _token_events[event] += 1
+        if sum(_token_events.values()) < TOKEN_METRICS_FLUSH_EVERY:
+            return
+        pending = dict(_token_events)
+        for name in _token_events:
+            _token_events[name] = 0
+
+    store = auth_cache()
+    for name, count in pending.items():
+        if not count:
+            continue
+        key = f'auth:token_{name}'
+        try:
+            store.incr(key, count)
+        except ValueError:
+            if not store.add(key, count, timeout=None):
+                store.incr(key, count)
+
+
+def token_cache_metrics():
+    store = auth_cache()
+    with _token_events_lock:
+        pending = dict(_token_events)
+    hits = store.get('auth:token_hits', 0) + pending['hits']
+    misses = store.get('auth:token_misses', 0) + pending['misses']
+    return {
+        'hits': hits,
+        'stale': 0,
+        'misses': misses,
+        'hit_rate': round(hits / (hits + misses), 4) if hits + misses else 0
+    }
+
+
+def token_cache_key(token_string):
+    return 'auth:token:' + hashlib.sha256(token_string.encode('utf-8')).hexdigest()
+
+
+def forget_tokens(token_strings):
+    auth_cache().delete_many([token_cache_key(token_string) for token_string in token_strings])
+
+
+def bearer_token(request):
+    scheme, _, value = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    value = value.strip()
+    return value if scheme.lower() == 'bearer' and value else None
+
+
+def token_timeout(token):
+    """Số giây còn lại của token (None nếu không có token, ví dụ đăng nhập bằng session)."""
+    if token is None or not getattr(token, 'expires', None):
+        return None
+    return max(1, int((token.expires - timezone.now()).total_seconds()))
+
+
+def resolve_role_user(user, token=None):
+    model = ROLE_MODELS.get(user.role)
+    if model is None:
+        return None
+
+    cache = auth_cache()
+    key = role_cache_key(user.pk)
+    cached = cache.get(key)
+    # Vai trò đã đổi kể từ lúc cache thì đọc lại
+    if cached is not None and cached[0] == user.role:
+        return cached[1]
+
+    role_user = model.objects.filter(pk=user.pk).first()
+    cache.set(key, (user.role, role_user), token_timeout(token) or settings.AUTH_CACHE_TIMEOUT)
+    return role_user
+
+
+def forget_role_user(user_id):
+    auth_cache().delete(role_cache_key(user_id))
+
+
+def get_role_user(request):
+    """
+    Đối tượng theo vai trò của người dùng hiện tại; request không đi qua
+    RoleOAuth2Authentication (session, test) thì được giải quyết ở lần gọi đầu tiên.
+    """
+    if not hasattr(request, 'role_user'):
+        user = request.user
+        request.role_user = resolve_role_user(user) if user.is_authenticated else None
+    return request.role_user
+
+
+class RoleOAuth2Authentication(OAuth2Authentication):
+    def authenticate(self, request):
+        token_string = bearer_token(request) if settings.AUTH_TOKEN_CACHE else None
+        if token_string:
+            token = auth_cache().get(token_cache_key(token_string))
+            if token is not None and not token.is_expired():
+                _count_token_event('hits')
+                request.role_user = resolve_role_user(token.user, token)
+                return token.user, token
+
+        result = super().authenticate(request)
+        if result is not None:
+            user, token = result
+            if token_string:
+                _count_token_event('misses')
+                auth_cache().set(token_cache_key(token_string), token, token_timeout(token))
+            request.role_user = resolve_role_user(user, token)
+        return result
@@ -0,0 +1,42 @@
+"""
+Chạy việc nặng (export, gửi thông báo hàng loạt...) ngoài luồng request trên một
+ThreadPoolExecutor dùng chung của process, không cần broker bên ngoài.
+
+Việc chỉ được giao sau khi transaction hiện tại commit để worker luôn thấy dữ liệu
+mà request vừa ghi. BACKGROUND_WORKERS = 0 thì chạy ngay trong request (khi debug).
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = Lock()
+
+
+def background_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.BACKGROUND_WORKERS, thread_name_prefix='background')
+    return _executor
+
+
+def _run(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Background task %s failed', func.__name__)
+    finally:
+        # Kết nối CSDL của luồng worker không được request/response của Django đóng hộ
+        connections.close_all()
+
+
+def run_in_background(func, *args):
+    if settings.BACKGROUND_WORKERS > 0:
+        transaction.on_commit(lambda: background_executor().submit(_run, func, *args))
+    else:
+        transaction.on_commit(lambda: func(*args))
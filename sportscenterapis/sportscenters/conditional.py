@@ -0,0 +1,85 @@
+"""
+GET có điều kiện (ETag/Last-Modified) cho các API danh sách.
+
+Phiên bản của một tập dữ liệu là (số dòng, giá trị lớn nhất của trường thời gian cập nhật),
+tính bằng một truy vấn aggregate trên đúng queryset đã lọc. Client gửi lại ETag qua
+If-None-Match (hoặc If-Modified-Since) và nhận 304 nếu tập dữ liệu không đổi.
+"""
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+
+def collection_version(queryset, fields=('updated_date',)):
+    """
+    (số dòng, thời điểm cập nhật mới nhất). `fields` có thể gồm trường của bảng liên quan
+    (ví dụ 'author__updated_date') khi serializer trả về dữ liệu của bảng đó.
+    """
+    aggregate = queryset.order_by().aggregate(
+        count=Count('pk'), **{f'max_{i}': Max(field) for i, field in enumerate(fields)}
+    )
+    stamps = [aggregate[f'max_{i}'] for i in range(len(fields)) if aggregate[f'max_{i}'] is not None]
+    return aggregate['count'], max(stamps, default=None)
+
+
+def version_stamp(last_modified):
+    return int(last_modified.timestamp() * 1_000_000) if last_modified else 0
+
+
+def collection_etag(count, last_modified, *parts):
+    return 'W/"%s"' % '-'.join(str(part) for part in (count, version_stamp(last_modified), *parts))
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
+
+
+def not_modified(request, etag, last_modified):
+    """
+    Trả về response 304 (kèm validator) nếu request có điều kiện khớp, ngược lại None.
+    """
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified.timestamp()) if last_modified else None
+    )
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    ETag/Last-Modified cho action list của viewset. Khi client gửi lại validator còn đúng,
+    view trả 304 ngay sau truy vấn aggregate, không đọc dòng nào và không serialize.
+
+    Chỉ dùng cho viewset mà mọi dữ liệu trả về đều được phản ánh qua `version_fields`
+    (dữ liệu lấy từ bảng khác thì thêm trường thời gian của bảng đó), hoặc qua
+    `get_extra_versions` khi nội dung phụ thuộc dữ liệu ngoài queryset (ví dụ của người gọi).
+    """
+    version_fields = ('updated_date',)
+
+    def get_extra_versions(self):
+        """
+        Danh sách (số dòng, thời điểm cập nhật) của các tập dữ liệu khác mà response phụ thuộc.
+        """
+        return []
+
+    def list(self, request, *args, **kwargs):
+        count, last_modified = collection_version(self.filter_queryset(self.get_queryset()), self.version_fields)
+        parts = []
+        for extra_count, extra_modified in self.get_extra_versions():
+            parts.append(f'{extra_count}.{version_stamp(extra_modified)}')
+            if extra_modified and (last_modified is None or extra_modified > last_modified):
+                last_modified = extra_modified
+        # Cùng URL nhưng khác định dạng (JSON / browsable API) thì khác nội dung
+        etag = collection_etag(count, last_modified, *parts, request.accepted_renderer.format)
+        response = not_modified(request, etag, last_modified)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+            set_validators(response, etag, last_modified)
+        # Nội dung phụ thuộc người dùng (is_enrolled...): chỉ cache phía client
+        patch_vary_headers(response, ['Authorization'])
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
@@ -0,0 +1,242 @@
+"""
+Xuất dữ liệu ra CSV: định nghĩa file dùng chung cho action của admin (stream trực tiếp)
+và cho job export nền (ghi ra MEDIA_ROOT rồi cho tải về).
+
+Job nền chạy trên pool dùng chung của `background`; lệnh `run_export_jobs` xử lý
+các job còn tồn (ví dụ khi process bị restart giữa chừng).
+"""
+import csv
+import os
+from django.conf import settings
+from django.contrib.admin.utils import build_q_object_from_lookup_parameters, lookup_spawns_duplicates, prepare_lookup_value
+from django.db.models import DateTimeField, Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.text import smart_split, unescape_string_literal
+from sportscenters.background import run_in_background
+from sportscenters.models import Enrollment, Payment, Member, Statistic, ExportJob
+from sportscenters.stats import day_start, day_end
+
+
+class Echo:
+    """File giả cho csv.writer: trả lại dòng vừa ghi thay vì lưu lại."""
+    def write(self, value):
+        return value
+
+
+def as_date(value):
+    return value.date() if value else ''
+
+
+class CSVExport:
+    """
+    Định nghĩa một file CSV: mỗi cột gồm (tiêu đề, lookup values_list, hàm định dạng tùy chọn).
+    Dữ liệu được đọc theo từng lô khóa chính tăng dần nên bộ nhớ không phụ thuộc số dòng.
+    """
+    chunk_size = 2000
+
+    def __init__(self, filename, columns):
+        self.filename = filename
+        self.columns = [column if len(column) == 3 else (*column, None) for column in columns]
+
+    def header(self):
+        return [title for title, _, _ in self.columns]
+
+    def iter_rows(self, queryset):
+        formatters = [formatter for _, _, formatter in self.columns]
+        queryset = queryset.order_by('pk').values_list('pk', *[lookup for _, lookup, _ in self.columns])
+        last_pk = None
+        while True:
+            chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            chunk = list(chunk[:self.chunk_size])
+            if not chunk:
+                return
+            for row in chunk:
+                yield [formatter(value) if formatter else value for formatter, value in zip(formatters, row[1:])]
+            last_pk = chunk[-1][0]
+
+    def iter_lines(self, queryset):
+        writer = csv.writer(Echo())
+        yield writer.writerow(self.header())
+        for row in self.iter_rows(queryset):
+            yield writer.writerow(row)
+
+    def response(self, queryset):
+        response = StreamingHttpResponse(self.iter_lines(queryset), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{self.filename}"'
+        return response
+
+
+ENROLLMENT_EXPORT = CSVExport('enrollments.csv', [
+    ('Member', 'member__full_name'),
+    ('Class', 'gym_class__name'),
+    ('Status', 'status'),
+    ('Created Date', 'created_date', as_date),
+])
+
+STATISTIC_EXPORT = CSVExport('stats.csv', [
+    ('Period Type', 'period_type'),
+    ('Start Date', 'period_start'),
+    ('End Date', 'period_end'),
+    ('Members', 'member_count'),
+    ('Revenue', 'total_revenue'),
+    ('Attendance Rate', 'attendance_rate'),
+])
+
+PAYMENT_EXPORT = CSVExport('payments.csv', [
+    ('Member', 'member__full_name'),
+    ('Amount', 'amount'),
+    ('Payment Method', 'payment_method'),
+    ('Status', 'status'),
+    ('Transaction ID', 'transaction_id'),
+    ('Date Paid', 'date_paid'),
+])
+
+MEMBER_EXPORT = CSVExport('members.csv', [
+    ('Username', 'username'),
+    ('Full Name', 'full_name'),
+    ('Email', 'email'),
+    ('Phone', 'phone'),
+    ('Payment Status', 'payment_status'),
+    ('Join Date', 'join_date'),
+    ('Cancellation Date', 'cancellation_date'),
+    ('Active', 'active'),
+])
+
+
+# kind của ExportJob -> (model, định nghĩa CSV, trường ngày dùng cho date_from/date_to)
+EXPORTS = {
+    'enrollments': (Enrollment, ENROLLMENT_EXPORT, 'created_date'),
+    'payments': (Payment, PAYMENT_EXPORT, 'date_paid'),
+    'members': (Member, MEMBER_EXPORT, 'join_date'),
+    'stats': (Statistic, STATISTIC_EXPORT, 'period_start'),
+}
+EXPORT_DIR = 'exports'
+
+
+# Tiền tố của search_fields trong admin -> lookup
+SEARCH_PREFIXES = {'^': 'istartswith', '=': 'iexact', '@': 'search'}
+
+
+def search_condition(search_fields, search_term):
+    """
+    Điều kiện giống ô tìm kiếm của admin: mỗi từ phải khớp ít nhất một trong `search_fields`.
+    """
+    lookups = [
+        f'{field[1:]}__{SEARCH_PREFIXES[field[0]]}' if field[0] in SEARCH_PREFIXES else f'{field}__icontains'
+        for field in search_fields
+    ]
+    condition = Q()
+    for bit in smart_split(search_term):
+        if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+            bit = unescape_string_literal(bit)
+        condition &= Q.create([(lookup, bit) for lookup in lookups], connector=Q.OR)
+    return condition
+
+
+def build_queryset(kind, params):
+    """
+    Queryset của một job theo params: danh sách khóa chính, bộ lọc và từ khóa của changelist admin
+    (`filters`, `search`, `search_fields`) và/hoặc khoảng ngày (YYYY-MM-DD).
+    """
+    model, _, date_field = EXPORTS[kind]
+    queryset = model._default_manager.all()
+    if params.get('pks'):
+        queryset = queryset.filter(pk__in=params['pks'])
+
+    filters = params.get('filters') or {}
+    search_fields = (params.get('search_fields') or []) if params.get('search') else []
+    if filters:
+        queryset = queryset.filter(build_q_object_from_lookup_parameters({
+            key: prepare_lookup_value(key, values) for key, values in filters.items()
+        }))
+    if search_fields:
+        queryset = queryset.filter(search_condition(search_fields, params['search']))
+    # Lọc qua quan hệ nhiều-nhiều/ngược có thể lặp dòng: bỏ trùng như changelist
+    lookups = [*filters, *(field.lstrip('^=@') for field in search_fields)]
+    if any(lookup_spawns_duplicates(model._meta, lookup) for lookup in lookups):
+        queryset = queryset.distinct()
+
+    # Trường DateTime được lọc theo mốc đầu/cuối ngày để vẫn dùng được index
+    is_datetime = isinstance(model._meta.get_field(date_field), DateTimeField)
+    date_from = parse_date(params.get('date_from') or '')
+    date_to = parse_date(params.get('date_to') or '')
+    if date_from:
+        queryset = queryset.filter(**{f'{date_field}__gte': day_start(date_from) if is_datetime else date_from})
+    if date_to:
+        queryset = queryset.filter(**{f'{date_field}__lte': day_end(date_to) if is_datetime else date_to})
+    return queryset
+
+
+def enqueue_export(kind, params=None, user=None):
+    """
+    Tạo job export và giao cho worker sau khi transaction hiện tại commit.
+    """
+    job = ExportJob.objects.create(kind=kind, params=params or {}, requested_by=user)
+    run_in_background(run_export_job, job.pk)
+    return job
+
+
+def write_export_files(job):
+    """
+    Ghi kết quả của job thành các file CSV tối đa EXPORT_ROWS_PER_FILE dòng (mỗi file có tiêu đề).
+    Trả về (danh sách đường dẫn tương đối trong MEDIA_ROOT, tổng số dòng).
+    """
+    _, export, _ = EXPORTS[job.kind]
+    directory = os.path.join(EXPORT_DIR, str(job.pk))
+    os.makedirs(os.path.join(settings.MEDIA_ROOT, directory), exist_ok=True)
+    name = os.path.splitext(export.filename)[0]
+    rows_per_file = settings.EXPORT_ROWS_PER_FILE
+
+    files, row_count, written = [], 0, 0
+    handle = writer = None
+    try:
+        for row in export.iter_rows(build_queryset(job.kind, job.params)):
+            if writer is None or written == rows_per_file:
+                if handle is not None:
+                    handle.close()
+                    # Cập nhật tiến độ để client đang poll thấy được
+                    ExportJob.objects.filter(pk=job.pk).update(files=files, row_count=row_count)
+                path = os.path.join(directory, f'{name}-{len(files) + 1:04d}.csv')
+                handle = open(os.path.join(settings.MEDIA_ROOT, path), 'w', newline='', encoding='utf-8')
+                writer = csv.writer(handle)
+                writer.writerow(export.header())
+                files.append(path)
+                written = 0
+            writer.writerow(row)
+            written += 1
+            row_count += 1
+
+        if not files:
+            path = os.path.join(directory, f'{name}-0001.csv')
+            with open(os.path.join(settings.MEDIA_ROOT, path), 'w', newline='', encoding='utf-8') as empty:
+                csv.writer(empty).writerow(export.header())
+            files.append(path)
+    finally:
+        if handle is not None:
+            handle.close()
+    return files, row_count
+
+
+def run_export_job(job_id):
+    """
+    Chạy một job export. Job chỉ được nhận khi còn 'pending' (UPDATE có điều kiện) nên
+    luồng nền và lệnh run_export_jobs không bao giờ cùng xử lý một job.
+    """
+    claimed = ExportJob.objects.filter(pk=job_id, status='pending').update(
+        status='running', updated_date=timezone.now()
+    )
+    if not claimed:
+        return
+    job = ExportJob.objects.get(pk=job_id)
+    try:
+        files, row_count = write_export_files(job)
+    except Exception as ex:
+        ExportJob.objects.filter(pk=job_id).update(
+            status='failed', error=str(ex), finished_at=timezone.now()
+        )
+        return
+    ExportJob.objects.filter(pk=job_id).update(
+        status='done', files=files, row_count=row_count, error='', finished_at=timezone.now()
+    )
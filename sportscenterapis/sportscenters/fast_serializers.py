@@ -0,0 +1,155 @@
+"""
+Đường serialize nhanh cho các API danh sách chỉ đọc.
+
+Thay vì tạo serializer cho từng đối tượng, serializer được "biên dịch" một lần thành
+danh sách (tên trường, hàm chuyển đổi) chạy trực tiếp trên các dòng `.values()`.
+Serializer không biên dịch được (trường lạ, to_representation tùy biến...) thì
+view tự quay về đường serialize thông thường.
+"""
+from rest_framework import serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+
+
+# Giá trị lấy từ CSDL đã đúng định dạng JSON, không cần chuyển đổi
+IDENTITY_FIELDS = (
+    serializers.CharField, serializers.ChoiceField, serializers.IntegerField,
+    serializers.FloatField, PrimaryKeyRelatedField,
+)
+# Cần gọi to_representation của field (định dạng ngày giờ, Decimal, bool...)
+CONVERTED_FIELDS = (
+    serializers.DateTimeField, serializers.DateField, serializers.TimeField,
+    serializers.DecimalField, serializers.BooleanField, serializers.DurationField,
+)
+
+_compiled = {}
+
+
+class CompiledSerializer:
+    def __init__(self, columns, plan):
+        self.columns = columns
+        self.plan = plan
+
+    def to_representation(self, rows, context):
+        plan = self.plan
+        return [{name: step(row, context) for name, step in plan} for row in rows]
+
+
+def _column_step(column, convert=None):
+    if convert is None:
+        return lambda row, context: row[column]
+
+    def step(row, context):
+        value = row[column]
+        return None if value is None else convert(value)
+    return step
+
+
+def _override_step(column, convert):
+    return lambda row, context: convert(row[column])
+
+
+def _method_step(prefix, columns, func):
+    def step(row, context):
+        return func({column: row[prefix + column] for column in columns}, context)
+    return step
+
+
+def _nested_step(pk_column, plan):
+    def step(row, context):
+        if row[pk_column] is None:
+            return None
+        return {name: nested(row, context) for name, nested in plan}
+    return step
+
+
+def _compile_fields(serializer, prefix, columns):
+    """
+    Trả về danh sách (tên, hàm) cho các trường đọc được của serializer, hoặc None
+    nếu có trường không hỗ trợ.
+    """
+    cls = type(serializer)
+    overrides = getattr(cls, 'fast_value_overrides', {})
+    method_fields = getattr(cls, 'fast_method_fields', {})
+    if 'to_representation' in vars(cls) and not overrides:
+        return None
+
+    model = serializer.Meta.model
+    plan = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+
+        if isinstance(field, serializers.SerializerMethodField):
+            if name not in method_fields:
+                return None
+            method_columns, func = method_fields[name]
+            columns.extend(prefix + column for column in method_columns)
+            plan.append((name, _method_step(prefix, method_columns, func)))
+            continue
+
+        if field.source == '*' or '.' in field.source:
+            return None
+
+        if isinstance(field, serializers.ModelSerializer):
+            relation = model._meta.get_field(field.source)
+            if not relation.many_to_one and not relation.one_to_one:
+                return None
+            nested_prefix = f"{prefix}{field.source}__"
+            nested_plan = _compile_fields(field, nested_prefix, columns)
+            if nested_plan is None:
+                return None
+            pk_column = f"{prefix}{field.source}"
+            columns.append(pk_column)
+            plan.append((name, _nested_step(pk_column, nested_plan)))
+            continue
+
+        column = prefix + field.source
+        if name in overrides:
+            columns.append(column)
+            plan.append((name, _override_step(column, overrides[name])))
+        elif isinstance(field, CONVERTED_FIELDS):
+            columns.append(column)
+            plan.append((name, _column_step(column, field.to_representation)))
+        elif isinstance(field, IDENTITY_FIELDS):
+            columns.append(column)
+            plan.append((name, _column_step(column)))
+        else:
+            return None
+    return plan
+
+
+def compile_serializer(serializer):
+    """
+    Biên dịch (có cache theo lớp serializer và tập trường) một serializer đã khởi tạo.
+    """
+    key = (type(serializer), tuple(serializer.fields))
+    if key not in _compiled:
+        columns = []
+        plan = _compile_fields(serializer, '', columns)
+        _compiled[key] = CompiledSerializer(list(dict.fromkeys(columns)), plan) if plan is not None else None
+    return _compiled[key]
+
+
+class FastListMixin:
+    """
+    Dùng đường serialize nhanh cho action list khi serializer hỗ trợ.
+    """
+    fast_list = True
+
+    def list(self, request, *args, **kwargs):
+        compiled = compile_serializer(self.get_serializer()) if self.fast_list else None
+        if compiled is None:
+            return super().list(request, *args, **kwargs)
+
+        # Cột dùng làm khóa cho phân trang keyset cũng phải có trong values()
+        columns = list(compiled.columns) + ['id']
+        for name in getattr(self, 'cursor_ordering', ()):
+            columns.append(name.lstrip('-'))
+        queryset = self.filter_queryset(self.get_queryset()).values(*dict.fromkeys(columns))
+
+        context = self.get_serializer_context()
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(compiled.to_representation(page, context))
+        return Response(compiled.to_representation(queryset, context))
@@ -0,0 +1,55 @@
+import secrets
+from datetime import timedelta
+from time import perf_counter
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from oauth2_provider.models import get_access_token_model
+from sportscenters.authentication import forget_tokens
+from sportscenters.models import User
+
+
+class Command(BaseCommand):
+    help = ('So sánh số request/giây của GET /users/current-user/ khi có và không có cache kiểm tra access token. '
+            'Tạo một access token tạm cho user được chọn và xóa nó khi kết thúc.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='User dùng để đo (mặc định: user đang hoạt động đầu tiên).')
+        parser.add_argument('--requests', type=int, default=500)
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(is_active=True)
+        user = users.filter(username=options['username']).first() if options['username'] else users.first()
+        if user is None:
+            raise CommandError('Không tìm thấy user để đo.')
+
+        token = get_access_token_model().objects.create(
+            user=user, token=secrets.token_urlsafe(30), scope='read write',
+            expires=timezone.now() + timedelta(hours=1)
+        )
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {token.token}')
+        try:
+            self.stdout.write(self.style.MIGRATE_HEADING(f'/users/current-user/ as {user.username}'))
+            with override_settings(AUTH_TOKEN_CACHE=False):
+                self.report('without token cache', client, options['requests'])
+            forget_tokens([token.token])
+            self.report('with token cache', client, options['requests'])
+        finally:
+            token.delete()
+
+    def report(self, label, client, count):
+        # Request đầu tiên làm nóng cache (và kết nối CSDL), không tính vào kết quả
+        client.get('/users/current-user/')
+        with CaptureQueriesContext(connection) as queries:
+            began = perf_counter()
+            for _ in range(count):
+                response = client.get('/users/current-user/')
+            elapsed = perf_counter() - began
+        if response.status_code != 200:
+            raise CommandError(f'{label}: HTTP {response.status_code}')
+        self.stdout.write(
+            f'  {label:<22} {count / elapsed:10,.0f} req/s   '
+            f'({elapsed / count * 1000:.2f} ms/req, {len(queries) / count:.1f} queries/req)'
+        )
@@ -0,0 +1,41 @@
+from time import perf_counter
+from django.core.management.base import BaseCommand
+from sportscenters.models import Member, Notification
+from sportscenters.notifications import MEMBER_SEGMENTS, FAN_OUT_CHUNK_SIZE, fan_out, new_batch_key
+
+
+class Command(BaseCommand):
+    help = ('Đo thông lượng fan-out thông báo (thông báo/giây) cho một nhóm hội viên, gồm cả lần chạy lại '
+            'cùng batch_key (phải không tạo thêm dòng). Cần sẵn dữ liệu hội viên, ví dụ benchmark_queries --seed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--segment', default='all', choices=list(MEMBER_SEGMENTS))
+        parser.add_argument('--chunk-size', type=int, action='append',
+                            help=f'Kích thước lô (có thể lặp lại). Mặc định: {FAN_OUT_CHUNK_SIZE}.')
+        parser.add_argument('--keep', action='store_true', help='Giữ lại thông báo đã tạo.')
+
+    def handle(self, *args, **options):
+        members = Member.objects.filter(**MEMBER_SEGMENTS[options['segment']]).count()
+        if not members:
+            self.stdout.write(self.style.WARNING('Không có hội viên trong nhóm này, bỏ qua'))
+            return
+        self.stdout.write(self.style.MIGRATE_HEADING(f'segment {options["segment"]}: {members} members'))
+
+        for chunk_size in options['chunk_size'] or [FAN_OUT_CHUNK_SIZE]:
+            batch_key = new_batch_key()
+            try:
+                self.report(f'chunk {chunk_size} first run', batch_key, options['segment'], chunk_size)
+                self.report(f'chunk {chunk_size} retry', batch_key, options['segment'], chunk_size)
+            finally:
+                if not options['keep']:
+                    Notification.objects.filter(batch_key=batch_key).delete()
+
+    def report(self, label, batch_key, segment, chunk_size):
+        before = Notification.objects.filter(batch_key=batch_key).count()
+        began = perf_counter()
+        targeted = fan_out('Benchmark', 'promotion', batch_key, segment=segment, chunk_size=chunk_size)
+        elapsed = perf_counter() - began
+        created = Notification.objects.filter(batch_key=batch_key).count() - before
+        self.stdout.write(
+            f'  {label:<24} {targeted / elapsed:12,.0f} members/s   ({elapsed:.2f} s, {created} new rows)'
+        )
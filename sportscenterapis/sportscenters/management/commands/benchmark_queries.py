@@ -0,0 +1,321 @@
+import random
+from datetime import timedelta
+from importlib import import_module
+from decimal import Decimal
+from time import perf_counter
+from django.core.management.base import BaseCommand
+from django.db import connection, migrations, transaction
+from django.db.models import Count, Q
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from sportscenters.models import User, Member, Trainer, Class, Enrollment, Payment, Notification
+from sportscenters.signals import trainer_display_name
+from sportscenters.stats import (
+    compute_member_stats, compute_revenue_stats, compute_class_enrollments, trunc_period, bump_stats_version
+)
+from sportscenters.views import StatisticViewSet
+
+
+BENCH_PREFIX = 'bench_'
+# Migration thêm các index cần so sánh
+INDEX_MIGRATION = 'sportscenters.migrations.0005_query_indexes'
+
+
+def query_indexes():
+    """(model, index) của các index do INDEX_MIGRATION thêm vào."""
+    from django.apps import apps
+    return [
+        (apps.get_model('sportscenters', operation.model_name), operation.index)
+        for operation in import_module(INDEX_MIGRATION).Migration.operations
+        if isinstance(operation, migrations.AddIndex)
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Sinh dữ liệu mẫu lớn (tùy chọn) rồi in EXPLAIN và thời gian chạy của các truy vấn danh sách/lọc '
+            'của API và truy vấn thống kê. --compare-indexes đo thêm một lần sau khi tạm bỏ các index '
+            'của 0005_query_indexes (tạo lại ngay sau đó) để so sánh trước/sau. Dữ liệu mẫu được ghi '
+            'thẳng vào CSDL đang cấu hình: nên chạy trên CSDL riêng và xóa bằng --cleanup.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', action='store_true', help='Sinh dữ liệu mẫu trước khi đo.')
+        parser.add_argument('--members', type=int, default=100_000)
+        parser.add_argument('--enrollments', type=int, default=1_000_000)
+        parser.add_argument('--classes', type=int, default=200)
+        parser.add_argument('--payments', type=int, default=200_000)
+        parser.add_argument('--period', default='weekly', choices=['weekly', 'monthly', 'yearly'])
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--page-size', type=int, default=10,
+                            help='Số dòng mỗi trang khi đo truy vấn danh sách (như phân trang của API).')
+        parser.add_argument('--compare-indexes', action='store_true',
+                            help='Đo lại khi không có các index của 0005_query_indexes (khóa bảng khi xóa/tạo lại).')
+        parser.add_argument('--yes', action='store_true',
+                            help='Không hỏi xác nhận trước khi tạm bỏ index với --compare-indexes.')
+        parser.add_argument('--cleanup', action='store_true',
+                            help=f'Xóa dữ liệu mẫu (tên bắt đầu bằng {BENCH_PREFIX}) của mọi lần --seed. '
+                                 'Dùng kèm --seed thì xóa sau khi đo, dùng riêng thì chỉ xóa.')
+
+    def handle(self, *args, **options):
+        if options['compare_indexes'] and not options['yes'] and not self.confirm_drop_indexes():
+            self.stdout.write('Đã hủy.')
+            return
+        if options['cleanup'] and not options['seed']:
+            self.cleanup()
+            return
+
+        try:
+            if options['seed']:
+                self.seed(options)
+            self.run_benchmarks(options)
+        finally:
+            if options['cleanup']:
+                self.cleanup()
+
+    def confirm_drop_indexes(self):
+        answer = input(
+            f'--compare-indexes sẽ xóa rồi tạo lại các index của {INDEX_MIGRATION} trên CSDL '
+            f'"{connection.settings_dict["NAME"]}". Bảng bị khóa trong lúc tạo lại index và nếu lệnh bị '
+            'ngắt giữa chừng thì index phải được tạo lại bằng tay.\n'
+            "Nhập 'yes' để tiếp tục: "
+        )
+        return answer.strip().lower() == 'yes'
+
+    def run_benchmarks(self, options):
+        self.benchmark(options, 'with indexes')
+        if options['compare_indexes']:
+            indexes = query_indexes()
+            with connection.schema_editor() as editor:
+                for model, index in indexes:
+                    editor.remove_index(model, index)
+            try:
+                self.benchmark(options, 'without 0005 indexes')
+            finally:
+                with connection.schema_editor() as editor:
+                    for model, index in indexes:
+                        editor.add_index(model, index)
+
+    def benchmark(self, options, title):
+        end = timezone.now()
+        start = end - timedelta(days=365)
+        period = options['period']
+        page_size = options['page_size']
+        viewset = StatisticViewSet()
+        querysets = self.filter_querysets(period, start, end)
+
+        self.section(f'EXPLAIN ({title})')
+        for label, queryset in querysets:
+            self.stdout.write(self.style.MIGRATE_LABEL(label))
+            self.stdout.write(queryset.explain())
+
+        # Truy vấn danh sách/lọc đo như endpoint phân trang chạy: một trang và COUNT
+        self.section(f'List/filter timings ({title})')
+        for label, queryset in querysets:
+            self.time(f'{label} [page]', lambda: list(queryset[:page_size]), options['repeat'])
+            self.time(f'{label} [count]', queryset.count, options['repeat'])
+
+        self.section(f'Stats timings ({title})')
+        for label, func in [
+            ('member_stats', lambda: compute_member_stats(period, start, end)),
+            ('revenue_stats', lambda: compute_revenue_stats(period, start, end)),
+            ('class_stats', lambda: viewset.compute_class_stats(period, start, end)),
+            ('class_member_stats', lambda: viewset.compute_class_member_stats(period, start, end)),
+            ('dashboard_enrollments', lambda: compute_class_enrollments(period, start, end)),
+        ]:
+            self.time(label, func, options['repeat'])
+
+    def time(self, label, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                began = perf_counter()
+                func()
+                timings.append(perf_counter() - began)
+        self.stdout.write(
+            f'{label:<52} best {min(timings) * 1000:9.1f} ms   '
+            f'avg {sum(timings) / len(timings) * 1000:9.1f} ms   queries {len(queries)}'
+        )
+
+    def filter_querysets(self, period, start, end):
+        sample_member = Member.objects.values_list('pk', flat=True).first()
+        sample_class = Class.objects.values_list('pk', flat=True).first()
+        return [
+            ('enrollments of member (is_enrolled)',
+             Enrollment.objects.filter(member_id=sample_member, status='approved').values_list('gym_class_id')),
+            ('enrollment list of member',
+             Enrollment.objects.filter(member_id=sample_member).order_by('-id')),
+            ('enrollments grouped by class and period',
+             Enrollment.objects.filter(status='approved', gym_class_id=sample_class, created_date__lte=end)
+             .annotate(bucket=trunc_period('created_date', period)).values('gym_class_id', 'bucket')
+             .annotate(total=Count('pk')).order_by()),
+            ('members joined by period',
+             Member.objects.filter(join_date__lte=end.date())
+             .annotate(bucket=trunc_period('join_date', period)).values('bucket')
+             .annotate(total=Count('pk')).order_by()),
+            ('members cancelled in range',
+             Member.objects.filter(cancellation_date__range=[start.date(), end.date()])),
+            ('successful payments in range',
+             Payment.objects.filter(status='success', date_paid__range=[start, end])),
+            ('active classes overlapping range',
+             Class.objects.filter(active=True, deleted_at__isnull=True, start_time__lte=end, end_time__gte=start)),
+            ('unread notifications of member',
+             Notification.objects.filter(member_id=sample_member, is_read=False).order_by('-created_at')),
+            ('notification list of member',
+             Notification.objects.filter(member_id=sample_member).order_by('-created_at', '-id')),
+        ]
+
+    def section(self, title):
+        self.stdout.write(self.style.SUCCESS(f'\n=== {title} ==='))
+
+    def seed(self, options):
+        """
+        Mỗi lô được ghi trong một transaction riêng: không giữ khóa và undo log của
+        hàng triệu dòng trong một transaction, lỗi giữa chừng chỉ mất lô đang ghi.
+        """
+        self.section('Seeding')
+        rng = random.Random(42)
+        now = timezone.now()
+        stamp = f'{now.timestamp():.0f}'
+        batch = 5000
+
+        with transaction.atomic():
+            trainer_count = max(1, options['classes'] // 5)
+            trainers = [
+                Trainer.objects.create(
+                    username=f'{BENCH_PREFIX}trainer_{stamp}_{i}',
+                    full_name=f'Trainer {i}',
+                    specialization=rng.choice(Trainer.SPECIALIZATIONS)[0],
+                    experience_years=rng.randint(1, 15)
+                ) for i in range(trainer_count)
+            ]
+
+            classes = []
+            for i in range(options['classes']):
+                trainer = rng.choice(trainers)
+                classes.append(Class(
+                    name=f'{BENCH_PREFIX}class_{stamp}_{i}',
+                    description='',
+                    trainer=trainer,
+                    # bulk_create không gửi pre_save: tự chép thông tin huấn luyện viên như copy_trainer_summary
+                    trainer_name=trainer_display_name(trainer),
+                    trainer_specialization=trainer.specialization,
+                    start_time=now - timedelta(days=rng.randint(0, 720)),
+                    end_time=now + timedelta(days=rng.randint(0, 180)),
+                    max_members=rng.randint(20, 100000),
+                    status='active',
+                    price=Decimal(rng.randint(100, 2000)) * 1000
+                ))
+            # MySQL không trả về khóa chính sau bulk_create nên phải đọc lại id theo tên
+            Class.objects.bulk_create(classes, batch_size=1000)
+        class_ids = list(Class.objects.filter(name__startswith=f'{BENCH_PREFIX}class_{stamp}_').values_list('pk', flat=True))
+        self.stdout.write(f'{len(trainers)} trainers, {len(class_ids)} classes')
+
+        # Member dùng kế thừa đa bảng nên không bulk_create được: chèn bảng cha rồi bảng con
+        member_ids = []
+        for offset in range(0, options['members'], batch):
+            usernames = [f'{BENCH_PREFIX}member_{stamp}_{i}' for i in range(offset, min(offset + batch, options['members']))]
+            with transaction.atomic():
+                User.objects.bulk_create([
+                    User(username=username, password='!', role='member', full_name=username) for username in usernames
+                ])
+                user_ids = list(User.objects.filter(username__in=usernames).values_list('pk', flat=True))
+                rows = []
+                for user_id in user_ids:
+                    join_date = (now - timedelta(days=rng.randint(0, 1095))).date()
+                    cancellation_date = join_date + timedelta(days=rng.randint(30, 365)) if rng.random() < 0.1 else None
+                    rows.append((user_id, 'paid', join_date, cancellation_date))
+                with connection.cursor() as cursor:
+                    cursor.executemany(
+                        f'INSERT INTO {Member._meta.db_table} '
+                        f'(user_ptr_id, payment_status, join_date, cancellation_date) VALUES (%s, %s, %s, %s)',
+                        rows
+                    )
+            member_ids.extend(user_ids)
+        self.stdout.write(f'{len(member_ids)} members')
+
+        created = 0
+        if member_ids and class_ids:
+            enrollments_per_member = max(1, min(len(class_ids), options['enrollments'] // len(member_ids)))
+            for offset in range(0, len(member_ids), batch):
+                batch_member_ids = member_ids[offset:offset + batch]
+                objs = []
+                for member_id in batch_member_ids:
+                    for class_id in rng.sample(class_ids, enrollments_per_member):
+                        objs.append(Enrollment(member_id=member_id, gym_class_id=class_id,
+                                               status=rng.choice(['approved', 'approved', 'approved', 'pending'])))
+                with transaction.atomic():
+                    Enrollment.objects.bulk_create(objs, batch_size=batch)
+                    self.backdate(Enrollment, 'created_date', objs, rng, now,
+                                  'member_id IN (%s)' % ', '.join(['%s'] * len(batch_member_ids)), batch_member_ids)
+                created += len(objs)
+        self.stdout.write(f'{created} enrollments')
+
+        payment_count = options['payments'] if member_ids else 0
+        for offset in range(0, payment_count, batch):
+            objs = [
+                Payment(
+                    member_id=rng.choice(member_ids),
+                    amount=Decimal(rng.randint(100, 5000)) * 1000,
+                    payment_method=rng.choice(Payment.PAYMENT_METHODS)[0],
+                    status=rng.choice(['success', 'success', 'failed', 'pending']),
+                    transaction_id=f'{BENCH_PREFIX}{stamp}_{offset // batch}_{i}'
+                ) for i in range(min(batch, payment_count - offset))
+            ]
+            with transaction.atomic():
+                Payment.objects.bulk_create(objs, batch_size=batch)
+                self.backdate(Payment, 'date_paid', objs, rng, now,
+                              'transaction_id LIKE %s', [f'{BENCH_PREFIX}{stamp}_{offset // batch}_%'])
+        self.stdout.write(f'{payment_count} payments')
+
+    def cleanup(self):
+        """
+        Xóa dữ liệu mẫu theo BENCH_PREFIX, bảng con trước bảng cha. Dùng DELETE theo lô khóa chính
+        thay vì QuerySet.delete(): không nạp cả triệu đối tượng và không sinh Tombstone cho dữ liệu mẫu.
+        """
+        self.section('Cleanup')
+        bench_member = Q(member__username__startswith=BENCH_PREFIX)
+        for model, condition in [
+            (Payment, bench_member),
+            (Notification, bench_member),
+            (Enrollment, bench_member | Q(gym_class__name__startswith=BENCH_PREFIX)),
+            (Class, Q(name__startswith=BENCH_PREFIX)),
+            (Member, Q(username__startswith=BENCH_PREFIX)),
+            (Trainer, Q(username__startswith=BENCH_PREFIX)),
+            (User, Q(username__startswith=BENCH_PREFIX)),
+        ]:
+            self.stdout.write(f'{self.delete_rows(model, condition)} {model._meta.db_table} rows deleted')
+
+        # DELETE thẳng không qua signal: tự làm mới cache thống kê
+        for source in ('members', 'payments', 'enrollments', 'classes'):
+            bump_stats_version(source)
+        self.stdout.write('Snapshot Statistic đã rollup khi còn dữ liệu mẫu cần tính lại: rollup_stats --full')
+
+    def delete_rows(self, model, condition, batch=5000):
+        queryset = model._base_manager.filter(condition).order_by()
+        table, pk_column = model._meta.db_table, model._meta.pk.column
+        deleted = 0
+        while True:
+            pks = list(queryset.values_list('pk', flat=True)[:batch])
+            if not pks:
+                return deleted
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {table} WHERE {pk_column} IN ({", ".join(["%s"] * len(pks))})', pks
+                )
+            deleted += len(pks)
+
+    def backdate(self, model, field, objs, rng, now, where, params):
+        """
+        Trường auto_now_add bị ghi bằng thời điểm chèn: rải lại trong 3 năm để các truy vấn theo kỳ có ý nghĩa.
+        """
+        if connection.vendor == 'mysql':
+            # MySQL không trả khóa chính sau bulk_create: cập nhật cả lô bằng một UPDATE với ngày ngẫu nhiên
+            column = model._meta.get_field(field).column
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'UPDATE {model._meta.db_table} SET {column} = %s - INTERVAL FLOOR(RAND() * 1095) DAY WHERE {where}',
+                    [now, *params]
+                )
+            return
+        for obj in objs:
+            setattr(obj, field, now - timedelta(days=rng.randint(0, 1094)))
+        model.objects.bulk_update(objs, [field], batch_size=1000)
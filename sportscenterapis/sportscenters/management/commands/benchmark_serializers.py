@@ -0,0 +1,55 @@
+from time import perf_counter
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from sportscenters.fast_serializers import compile_serializer
+from sportscenters.models import Class, Enrollment
+from sportscenters.renderers import FastJSONRenderer
+from sportscenters.serializers import ClassSerializer, EnrollmentSerializer
+
+
+class Command(BaseCommand):
+    help = 'So sánh số dòng/giây giữa serializer DRF thông thường và đường serialize nhanh (values() + orjson).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        cases = [
+            ('classes', ClassSerializer, lambda: Class.objects.order_by('-id')),
+            ('enrollments', EnrollmentSerializer, lambda: Enrollment.objects.select_related('member', 'gym_class')),
+        ]
+        context = {'enrolled_class_ids': set()}
+
+        for label, serializer_class, queryset in cases:
+            compiled = compile_serializer(serializer_class(context=context))
+            if compiled is None:
+                self.stdout.write(self.style.WARNING(f'{label}: serializer không hỗ trợ đường nhanh, bỏ qua'))
+                continue
+
+            def standard():
+                return serializer_class(queryset()[:rows], many=True, context=context).data
+
+            def fast():
+                return compiled.to_representation(queryset().values(*compiled.columns)[:rows], context)
+
+            data = standard()
+            count = len(data)
+            if not count:
+                self.stdout.write(self.style.WARNING(f'{label}: không có dữ liệu, bỏ qua'))
+                continue
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{label} ({count} rows)'))
+            self.report('DRF serializer', standard, count, repeat)
+            self.report('values() fast path', fast, count, repeat)
+            self.report('JSONRenderer', lambda: JSONRenderer().render(data), count, repeat)
+            self.report('FastJSONRenderer', lambda: FastJSONRenderer().render(data), count, repeat)
+
+    def report(self, label, func, count, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            began = perf_counter()
+            func()
+            best = min(best, perf_counter() - began)
+        self.stdout.write(f'  {label:<20} {count / best:12,.0f} rows/s   ({best * 1000:.1f} ms)')
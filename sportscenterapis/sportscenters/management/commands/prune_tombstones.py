@@ -0,0 +1,14 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from sportscenters.models import Tombstone
+
+
+class Command(BaseCommand):
+    help = 'Xóa Tombstone cũ hơn SYNC_TOMBSTONE_DAYS (client có since cũ hơn sẽ nhận 410 và đồng bộ lại toàn bộ).'
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_DAYS)
+        deleted, _ = Tombstone.objects.filter(deleted_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f'{deleted} tombstones pruned'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from sportscenters.stats import PERIOD_TRUNC, rollup_statistics, prune_statistic_dirty_dates
+
+
+class Command(BaseCommand):
+    help = 'Chốt snapshot Statistic cho các kỳ tuần/tháng/năm đã đóng (chạy định kỳ, ví dụ bằng cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', choices=list(PERIOD_TRUNC), action='append',
+                            help='Chỉ rollup kỳ này (có thể lặp lại). Mặc định: tất cả.')
+        parser.add_argument('--full', action='store_true',
+                            help='Tính lại toàn bộ lịch sử thay vì chỉ các kỳ có dữ liệu mới.')
+
+    def handle(self, *args, **options):
+        for period in options['period'] or list(PERIOD_TRUNC):
+            written = rollup_statistics(period, full=options['full'])
+            self.stdout.write(self.style.SUCCESS(f'{period}: {written} statistic rows written'))
+        pruned = prune_statistic_dirty_dates()
+        self.stdout.write(f'{pruned} processed dirty dates pruned')
@@ -0,0 +1,33 @@
+from datetime import timedelta
+from time import sleep
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from sportscenters.exports import run_export_job
+from sportscenters.models import ExportJob
+
+
+class Command(BaseCommand):
+    help = 'Xử lý các job export còn tồn (ví dụ job đang chờ khi process web bị restart).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Chạy liên tục, kiểm tra job mới theo --interval giây.')
+        parser.add_argument('--interval', type=float, default=5.0)
+        parser.add_argument('--stale-minutes', type=int, default=0,
+                            help='Đưa các job "running" quá số phút này về "pending" (worker cũ đã chết).')
+
+    def handle(self, *args, **options):
+        while True:
+            if options['stale_minutes']:
+                cutoff = timezone.now() - timedelta(minutes=options['stale_minutes'])
+                requeued = ExportJob.objects.filter(status='running', updated_date__lt=cutoff).update(status='pending')
+                if requeued:
+                    self.stdout.write(self.style.WARNING(f'{requeued} stale jobs requeued'))
+
+            for job_id in ExportJob.objects.filter(status='pending').order_by('id').values_list('pk', flat=True):
+                run_export_job(job_id)
+                job = ExportJob.objects.get(pk=job_id)
+                self.stdout.write(f'job #{job.pk} {job.kind}: {job.status} ({job.row_count} rows, {len(job.files)} files)')
+
+            if not options['loop']:
+                return
+            sleep(options['interval'])
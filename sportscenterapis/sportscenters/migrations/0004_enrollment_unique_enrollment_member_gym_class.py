@@ -0,0 +1,39 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+def remove_duplicate_enrollments(apps, schema_editor):
+    """
+    Giữ lại đăng ký cũ nhất của mỗi cặp (học viên, lớp) và trả lại chỗ mà các bản trùng đã chiếm.
+    """
+    Enrollment = apps.get_model('sportscenters', 'Enrollment')
+    Class = apps.get_model('sportscenters', 'Class')
+    duplicates = (
+        Enrollment.objects.values('member_id', 'gym_class_id')
+        .annotate(keep_id=models.Min('id'), total=models.Count('id'))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    for row in duplicates:
+        removed, _ = Enrollment.objects.filter(
+            member_id=row['member_id'], gym_class_id=row['gym_class_id']
+        ).exclude(pk=row['keep_id']).delete()
+        gym_class = Class.objects.get(pk=row['gym_class_id'])
+        gym_class.current_capacity = max(0, gym_class.current_capacity - removed)
+        gym_class.save(update_fields=['current_capacity'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sportscenters', '0003_remove_class_schedule_class_current_capacity_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_enrollments, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='enrollment',
+            constraint=models.UniqueConstraint(fields=('member', 'gym_class'), name='unique_enrollment_member_gym_class'),
+        ),
+    ]
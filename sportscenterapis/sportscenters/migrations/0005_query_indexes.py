@@ -0,0 +1,57 @@
+# Generated by Django 5.1.6 on 2026-10-18 10:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sportscenters', '0004_enrollment_unique_enrollment_member_gym_class'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(fields=['join_date'], name='member_join_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(fields=['cancellation_date'], name='member_cancel_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='class',
+            index=models.Index(fields=['active', 'deleted_at', 'start_time', 'end_time'], name='class_active_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='class',
+            index=models.Index(fields=['start_time', 'end_time'], name='class_time_range_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['member', 'status'], name='enroll_member_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['gym_class', 'status', 'created_date'], name='enroll_class_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['status', 'created_date'], name='enroll_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['updated_date'], name='enroll_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', 'date_paid'], name='payment_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['member', 'is_read', 'created_at'], name='notif_member_read_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='statistic',
+            index=models.Index(fields=['period_type', 'period_start'], name='stat_period_start_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.6 on 2026-10-18 10:41
+
+from django.db import migrations, models
+
+
+def backfill_trainer_summary(apps, schema_editor):
+    Class = apps.get_model('sportscenters', 'Class')
+    Trainer = apps.get_model('sportscenters', 'Trainer')
+    for trainer in Trainer.objects.only('first_name', 'last_name', 'specialization').iterator():
+        Class.objects.filter(trainer_id=trainer.pk).update(
+            trainer_name=f"{trainer.first_name} {trainer.last_name}",
+            trainer_specialization=trainer.specialization
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sportscenters', '0005_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='class',
+            name='trainer_name',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='class',
+            name='trainer_specialization',
+            field=models.CharField(blank=True, editable=False, max_length=20, null=True),
+        ),
+        migrations.RunPython(backfill_trainer_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.6 on 2026-10-18 14:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sportscenters', '0006_class_trainer_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('active', models.BooleanField(default=True)),
+                ('created_date', models.DateTimeField(auto_now_add=True, null=True)),
+                ('updated_date', models.DateTimeField(auto_now=True, null=True)),
+                ('kind', models.CharField(choices=[('enrollments', 'Enrollments'), ('payments', 'Payments'), ('members', 'Members'), ('stats', 'Statistics')], max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('params', models.JSONField(blank=True, default=dict)),
+                ('files', models.JSONField(blank=True, default=list)),
+                ('row_count', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-id'],
+                'abstract': False,
+                'indexes': [models.Index(fields=['status', 'created_date'], name='export_status_date_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.6 on 2026-10-18 15:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sportscenters', '0007_exportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='batch_key',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(fields=('batch_key', 'member'), name='unique_notification_batch_member'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+def backfill_notification_updated_at(apps, schema_editor):
+    Notification = apps.get_model('sportscenters', 'Notification')
+    Notification.objects.filter(updated_at__isnull=True).update(updated_at=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sportscenters', '0008_notification_batch_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+        migrations.RunPython(backfill_notification_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['member', 'updated_at'], name='notif_member_updated_idx'),
+        ),
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('class', 'Class'), ('enrollment', 'Enrollment'), ('notification', 'Notification')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('owner_id', models.BigIntegerField(blank=True, null=True)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'deleted_at'], name='tombstone_kind_date_idx'), models.Index(fields=['kind', 'owner_id', 'deleted_at'], name='tombstone_owner_date_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.6 on 2026-10-18 18:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sportscenters', '0009_delta_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatisticDirtyDate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='stat_dirty_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sportscenters', '0011_enrollment_status_choices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tombstone',
+            name='class_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['kind', 'class_id', 'deleted_at'], name='tombstone_class_date_idx'),
+        ),
+    ]
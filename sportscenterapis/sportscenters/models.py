@@ -53,6 +53,10 @@ class Member(User):
     class Meta:
         verbose_name = 'Member'
         verbose_name_plural = 'Members'
+        indexes = [
+            models.Index(fields=['join_date'], name='member_join_date_idx'),
+            models.Index(fields=['cancellation_date'], name='member_cancel_date_idx'),
+        ]
 
 
 class Trainer(User):
@@ -108,6 +112,9 @@ class Class(BaseModel):
     max_members = models.IntegerField()
     status = models.CharField(max_length=20, choices=[('active', 'Active'), ('cancelled', 'Cancelled'), ('completed', 'Completed')])
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    # Bản sao thông tin huấn luyện viên (đồng bộ qua signals) để danh sách lớp không phải join bảng user
+    trainer_name = models.CharField(max_length=255, null=True, blank=True, editable=False)
+    trainer_specialization = models.CharField(max_length=20, null=True, blank=True, editable=False)
 
 
     def __str__(self):
@@ -116,16 +123,37 @@ class Class(BaseModel):
     class Meta:
         verbose_name = 'Class'
         verbose_name_plural = 'Classes'
+        indexes = [
+            models.Index(fields=['active', 'deleted_at', 'start_time', 'end_time'], name='class_active_time_idx'),
+            models.Index(fields=['start_time', 'end_time'], name='class_time_range_idx'),
+        ]
 
 
 class Enrollment(BaseModel):
+    STATUSES = [
+        ('pending', 'Pending'),
+        ('approved', 'Approved'),
+        ('rejected', 'Rejected'),
+    ]
+
     member = models.ForeignKey(Member, on_delete=models.CASCADE)
     gym_class = models.ForeignKey(Class, on_delete=models.CASCADE)
-    status = models.CharField(max_length=10, default='approved')
+    status = models.CharField(max_length=10, choices=STATUSES, default='approved')
 
     def __str__(self):
         return f"{self.member.username} - {self.gym_class.name}"
 
+    class Meta(BaseModel.Meta):
+        constraints = [
+            models.UniqueConstraint(fields=['member', 'gym_class'], name='unique_enrollment_member_gym_class'),
+        ]
+        indexes = [
+            models.Index(fields=['member', 'status'], name='enroll_member_status_idx'),
+            models.Index(fields=['gym_class', 'status', 'created_date'], name='enroll_class_status_date_idx'),
+            models.Index(fields=['status', 'created_date'], name='enroll_status_date_idx'),
+            models.Index(fields=['updated_date'], name='enroll_updated_idx'),
+        ]
+
 
 
 class Progress(BaseModel):
@@ -169,6 +197,11 @@ class Payment(models.Model):
     def __str__(self):
         return f"{self.member.username} - {self.status}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'date_paid'], name='payment_status_date_idx'),
+        ]
+
 
 class Notification(models.Model):
     NOTIFICATION_TYPES = [
@@ -182,10 +215,23 @@ class Notification(models.Model):
     type = models.CharField(max_length=20, choices=NOTIFICATION_TYPES)
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Thời điểm thay đổi gần nhất (cho ?since=); các UPDATE hàng loạt phải tự gán trường này
+    updated_at = models.DateTimeField(auto_now=True, null=True)
+    # Khóa của lần gửi hàng loạt: gửi lại cùng batch_key không tạo thông báo trùng
+    batch_key = models.CharField(max_length=64, null=True, blank=True)
 
     def __str__(self):
         return f"{self.member.username} - {self.type}"
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['batch_key', 'member'], name='unique_notification_batch_member'),
+        ]
+        indexes = [
+            models.Index(fields=['member', 'is_read', 'created_at'], name='notif_member_read_date_idx'),
+            models.Index(fields=['member', 'updated_at'], name='notif_member_updated_idx'),
+        ]
+
 
 class InternalNews(BaseModel):
     author = models.ForeignKey(Trainer, on_delete=models.CASCADE)
@@ -212,4 +258,89 @@ class Statistic(models.Model):
     class_id = models.ForeignKey(Class, on_delete=models.CASCADE, null=True, blank=True)
     enrollment_count = models.IntegerField(default=0)
     attendance_rate = models.FloatField(default=0.0)
-    created_at = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['period_type', 'period_start'], name='stat_period_start_idx'),
+        ]
+
+
+class StatisticDirtyDate(models.Model):
+    """
+    Ngày (thuộc kỳ đã chốt) có dữ liệu bị sửa/xóa mà bảng nguồn không tự ghi lại được,
+    ví dụ thanh toán chuyển sang success hoặc đăng ký bị xóa hẳn. rollup_stats dùng để
+    biết cần tính lại snapshot từ kỳ nào.
+    """
+    day = models.DateField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='stat_dirty_created_idx'),
+        ]
+
+
+class Tombstone(models.Model):
+    """
+    Dấu vết của dòng đã bị xóa hẳn, để client đồng bộ bằng ?since= biết cần bỏ dòng nào.
+    """
+    KINDS = [
+        ('class', 'Class'),
+        ('enrollment', 'Enrollment'),
+        ('notification', 'Notification'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KINDS)
+    object_id = models.BigIntegerField()
+    # Học viên sở hữu dòng đã xóa (nếu có), để hội viên chỉ nhận tombstone của mình
+    owner_id = models.BigIntegerField(null=True, blank=True)
+    # Lớp của enrollment đã xóa, để huấn luyện viên chỉ nhận tombstone của lớp mình dạy
+    class_id = models.BigIntegerField(null=True, blank=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.kind} #{self.object_id}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'deleted_at'], name='tombstone_kind_date_idx'),
+            models.Index(fields=['kind', 'owner_id', 'deleted_at'], name='tombstone_owner_date_idx'),
+            models.Index(fields=['kind', 'class_id', 'deleted_at'], name='tombstone_class_date_idx'),
+        ]
+
+
+class ExportJob(BaseModel):
+    KINDS = [
+        ('enrollments', 'Enrollments'),
+        ('payments', 'Payments'),
+        ('members', 'Members'),
+        ('stats', 'Statistics'),
+    ]
+    STATUSES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KINDS)
+    status = models.CharField(max_length=10, choices=STATUSES, default='pending')
+    # Bộ lọc của job: {'pks': [...]} (chọn tay trong một trang), {'filters': {tham số: [giá trị]},
+    # 'search': từ khóa, 'search_fields': [...]} (chọn tất cả theo changelist admin)
+    # và/hoặc {'date_from': 'YYYY-MM-DD', 'date_to': 'YYYY-MM-DD'}
+    params = models.JSONField(default=dict, blank=True)
+    # Đường dẫn tương đối (trong MEDIA_ROOT) của các file CSV đã ghi
+    files = models.JSONField(default=list, blank=True)
+    row_count = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} - {self.status}"
+
+    class Meta(BaseModel.Meta):
+        indexes = [
+            models.Index(fields=['status', 'created_date'], name='export_status_date_idx'),
+        ]
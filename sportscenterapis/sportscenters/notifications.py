@@ -0,0 +1,136 @@
+"""
+Gửi thông báo hàng loạt (fan-out) tới học viên của một lớp hoặc một nhóm hội viên.
+
+Danh sách học viên được đọc theo từng lô khóa chính và chèn bằng bulk_create, không
+gửi signal và không giữ cả danh sách trong bộ nhớ. Mỗi lần gửi có một batch_key;
+ràng buộc duy nhất (batch_key, member) cùng ignore_conflicts giúp chạy lại sau lỗi
+mà không tạo thông báo trùng.
+
+Số thông báo chưa đọc trên badge được giữ trong cache COUNTERS_CACHE_ALIAS và cộng/trừ
+bằng incr/decr khi tạo/đọc/xóa thông báo, nên app hỏi badge không phải đếm lại bảng.
+incr/decr chỉ nguyên tử trên Redis/memcached; khi chưa cấu hình cache đó thì đếm trực tiếp
+bằng index (member, is_read, created_at), vẫn chính xác chỉ tốn một truy vấn.
+"""
+from uuid import uuid4
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from sportscenters.background import run_in_background
+from sportscenters.models import Member, Enrollment, Notification
+
+FAN_OUT_CHUNK_SIZE = 5000
+
+# Nhóm hội viên có thể nhận thông báo hàng loạt
+MEMBER_SEGMENTS = {
+    'all': {},
+    'active': {'is_active': True, 'cancellation_date__isnull': True},
+    'paid': {'payment_status': 'paid'},
+    'unpaid': {'payment_status': 'unpaid'},
+}
+
+
+def counters_cache():
+    alias = getattr(settings, 'COUNTERS_CACHE_ALIAS', None)
+    return caches[alias] if alias else None
+
+
+def unread_cache_key(member_id):
+    return f'notifications:unread:{member_id}'
+
+
+def count_unread(member_id):
+    return Notification.objects.filter(member_id=member_id, is_read=False).count()
+
+
+def get_unread_count(member_id):
+    cache = counters_cache()
+    if cache is None:
+        return count_unread(member_id)
+    key = unread_cache_key(member_id)
+    count = cache.get(key)
+    if count is None:
+        count = count_unread(member_id)
+        # add() không ghi đè giá trị mà request khác vừa dựng lại; TIMEOUT của cache giới hạn
+        # thời gian sống của một giá trị lệch (thông báo tạo đúng lúc đang đếm)
+        cache.add(key, count)
+    return max(0, count)
+
+
+def adjust_unread_count(member_id, delta):
+    cache = counters_cache()
+    if cache is None or not delta:
+        return
+
+    def apply():
+        key = unread_cache_key(member_id)
+        try:
+            if delta > 0:
+                cache.incr(key, delta)
+            else:
+                cache.decr(key, -delta)
+        except ValueError:
+            # Chưa có trong cache: lần đọc tiếp theo sẽ đếm lại từ index
+            pass
+
+    # Chỉ cộng/trừ khi giao dịch đã commit, rollback thì bộ đếm không bị lệch
+    transaction.on_commit(apply)
+
+
+def forget_unread_counts(member_ids):
+    cache = counters_cache()
+    if cache is not None:
+        keys = [unread_cache_key(member_id) for member_id in member_ids]
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def new_batch_key():
+    return uuid4().hex
+
+
+def target_member_ids(gym_class=None, segment=None):
+    """
+    Trả về (queryset values_list id học viên, tên cột id) của nhóm nhận thông báo.
+    """
+    if gym_class is not None:
+        queryset = Enrollment.objects.filter(gym_class_id=gym_class, status='approved')
+        return queryset.values_list('member_id', flat=True), 'member_id'
+    return Member.objects.filter(**MEMBER_SEGMENTS[segment]).values_list('pk', flat=True), 'pk'
+
+
+def iter_id_chunks(queryset, column, size):
+    queryset = queryset.order_by(column)
+    last_id = None
+    while True:
+        chunk = queryset if last_id is None else queryset.filter(**{f'{column}__gt': last_id})
+        chunk = list(chunk[:size])
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1]
+
+
+def fan_out(message, notification_type, batch_key, gym_class=None, segment=None, chunk_size=FAN_OUT_CHUNK_SIZE):
+    """
+    Tạo thông báo cho từng học viên trong nhóm nhận. Trả về số học viên đã duyệt qua
+    (kể cả những người đã có thông báo của batch_key này từ lần chạy trước).
+    """
+    member_ids, column = target_member_ids(gym_class, segment)
+    targeted = 0
+    for chunk in iter_id_chunks(member_ids, column, chunk_size):
+        Notification.objects.bulk_create([
+            Notification(member_id=member_id, message=message, type=notification_type, batch_key=batch_key)
+            for member_id in chunk
+        ], ignore_conflicts=True)
+        # ignore_conflicts không cho biết dòng nào được chèn thật nên xóa bộ đếm của cả lô
+        forget_unread_counts(chunk)
+        targeted += len(chunk)
+    return targeted
+
+
+def enqueue_fan_out(message, notification_type, batch_key=None, gym_class=None, segment=None):
+    """
+    Giao việc fan-out cho luồng nền và trả về batch_key (client dùng lại khi thử lại).
+    """
+    batch_key = batch_key or new_batch_key()
+    run_in_background(fan_out, message, notification_type, batch_key, gym_class, segment)
+    return batch_key
@@ -1,4 +1,254 @@
+import hashlib
+import json
+from django.core.cache import cache
+from django.core.paginator import Paginator as DjangoPaginator
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param, remove_query_param
 
 class StandardResultsSetPagination(pagination.PageNumberPagination):
-    page_size = 10
\ No newline at end of file
+    page_size = 10
+
+
+def estimated_table_rows(queryset):
+    """
+    Số dòng ước lượng của cả bảng từ thống kê của CSDL (bỏ qua điều kiện lọc của queryset).
+    Trả về None nếu không ước lượng được.
+    """
+    if queryset.query.distinct:
+        return None
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", [table]
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None and row[0] >= 0 else None
+
+
+class CachedCountPaginator(DjangoPaginator):
+    """
+    Paginator đếm tổng số dòng rẻ hơn: bảng lớn dùng số ước lượng của CSDL khi được phép
+    (allow_estimate), còn lại cache kết quả COUNT(*) theo câu truy vấn trong thời gian ngắn.
+    """
+    count_cache_timeout = 60
+    estimate_threshold = 100000
+
+    def __init__(self, *args, allow_estimate=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.allow_estimate = allow_estimate
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not hasattr(queryset, 'query'):
+            return super().count
+
+        if self.allow_estimate:
+            estimate = estimated_table_rows(queryset)
+            if estimate is not None and estimate >= self.estimate_threshold:
+                return estimate
+
+        try:
+            signature = str(queryset.query)
+        except EmptyResultSet:
+            return 0
+        cache_key = f"page_count_{hashlib.md5(signature.encode()).hexdigest()}"
+        count = cache.get(cache_key)
+        if count is None:
+            count = queryset.count()
+            cache.set(cache_key, count, timeout=self.count_cache_timeout)
+        return count
+
+
+class ApproximateCountPagination(StandardResultsSetPagination):
+    """
+    Phân trang theo số trang với COUNT được cache/ước lượng.
+    Client gửi ?count=false để bỏ hẳn trường count (chỉ lấy thêm một dòng để biết còn trang sau).
+    """
+    count_query_param = 'count'
+    # Tham số không thu hẹp tập kết quả (chọn trang, chọn trường, định dạng)
+    unfiltered_params = ('fields', 'format')
+
+    def skip_count(self, request):
+        return request.query_params.get(self.count_query_param, '').lower() in ('0', 'false', 'no')
+
+    def default_scope_only(self, request):
+        """
+        Request không lọc gì thêm ngoài phạm vi mặc định của view (ví dụ active=True):
+        khi đó số ước lượng của cả bảng đủ gần với tổng thật.
+        """
+        allowed = {self.page_query_param, self.count_query_param, *self.unfiltered_params}
+        return set(request.query_params) <= allowed
+
+    def django_paginator_class(self, object_list, per_page):
+        # DRF gọi self.django_paginator_class(queryset, page_size) trong paginate_queryset
+        return CachedCountPaginator(object_list, per_page, allow_estimate=self.allow_estimate)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.without_count = self.skip_count(request)
+        if not self.without_count:
+            self.allow_estimate = self.default_scope_only(request)
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        try:
+            self.page_number = int(request.query_params.get(self.page_query_param, 1))
+            if self.page_number < 1:
+                raise ValueError
+        except ValueError:
+            raise NotFound(self.invalid_page_message)
+
+        offset = (self.page_number - 1) * page_size
+        rows = list(queryset[offset:offset + page_size + 1])
+        self.has_next = len(rows) > page_size
+        return rows[:page_size]
+
+    def get_paginated_response(self, data):
+        if not self.without_count:
+            return super().get_paginated_response(data)
+
+        url = self.request.build_absolute_uri()
+        next_url = replace_query_param(url, self.page_query_param, self.page_number + 1) if self.has_next else None
+        previous_url = None
+        if self.page_number == 2:
+            previous_url = remove_query_param(url, self.page_query_param)
+        elif self.page_number > 2:
+            previous_url = replace_query_param(url, self.page_query_param, self.page_number - 1)
+        return Response({
+            'next': next_url,
+            'previous': previous_url,
+            'results': data,
+        })
+
+
+class KeysetPagination(pagination.CursorPagination):
+    """
+    Cursor theo toàn bộ bộ khóa sắp xếp, ví dụ (-created_at, -id), thay vì chỉ trường đầu như
+    CursorPagination của DRF. Với DRF, một trang toàn dòng trùng created_at chỉ còn cursor dạng
+    offset, nên dòng mới chèn vào làm trang sau lặp lại dòng cũ. Trường cuối của ordering phải duy nhất.
+    """
+    page_size = 10
+    ordering = '-id'
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for field in ordering:
+            name = field.lstrip('-')
+            values.append(str(instance[name] if isinstance(instance, dict) else getattr(instance, name)))
+        return json.dumps(values)
+
+    def keyset_filter(self, position, reverse):
+        """
+        Điều kiện "đứng sau position" theo thứ tự từ điển trên các trường của ordering.
+        """
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = '__lt' if reverse != field.startswith('-') else '__gt'
+            condition |= Q(**equal, **{name + lookup: value})
+            equal[name] = value
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Như CursorPagination.paginate_queryset, chỉ khác bước lọc theo vị trí
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*pagination._reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            queryset = queryset.filter(self.keyset_filter(current_position, reverse))
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = list(results[:self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+
+class CursorOptionalPagination(ApproximateCountPagination):
+    """
+    Phân trang theo số trang như cũ; client có thể chọn keyset (cursor) cho từng
+    request bằng ?pagination=cursor hoặc khi gửi lại ?cursor= từ link next/previous.
+    Thứ tự keyset lấy từ `cursor_ordering` của view (mặc định '-id').
+    """
+    cursor_pagination_class = KeysetPagination
+
+    def use_cursor(self, request):
+        params = request.query_params
+        return params.get('pagination') == 'cursor' or KeysetPagination.cursor_query_param in params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if self.use_cursor(request):
+            self.cursor_paginator = self.cursor_pagination_class()
+            self.cursor_paginator.ordering = getattr(view, 'cursor_ordering', self.cursor_paginator.ordering)
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
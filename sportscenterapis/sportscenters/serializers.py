@@ -5,7 +5,33 @@ from rest_framework.validators import UniqueValidator
 from rest_framework import serializers
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from .models import Class, Trainer, User, Progress,Receptionist,Payment,Member,Notification,Appointment,InternalNews,Enrollment, Statistic
+from .models import Class, Trainer, User, Progress,Receptionist,Payment,Member,Notification,Appointment,InternalNews,Enrollment, Statistic, ExportJob
+from .authentication import get_role_user
+from .exports import enqueue_export
+from .notifications import MEMBER_SEGMENTS
+
+
+# Các trường của User an toàn để trả về cho client (không có mật khẩu, quyền hạn)
+USER_PUBLIC_FIELDS = [
+    'id', 'username', 'first_name', 'last_name', 'full_name', 'email', 'phone', 'avatar',
+    'role', 'is_active', 'active', 'date_joined', 'created_date', 'updated_date'
+]
+
+
+class DynamicFieldsMixin:
+    """
+    Nhận thêm tham số `fields` (danh sách tên trường) và chỉ giữ lại các trường đó.
+    Tên không tồn tại bị bỏ qua; nếu không trường nào khớp thì giữ nguyên.
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields:
+            keep = set(fields) & set(self.fields)
+            if keep:
+                for name in set(self.fields) - keep:
+                    self.fields.pop(name)
 
 class UserProfileSerializer(serializers.ModelSerializer):
     class Meta:
@@ -20,10 +46,30 @@ class UserProfileSerializer(serializers.ModelSerializer):
         instance.save()
         return instance
 
-class ClassSerializer(ModelSerializer):
+def fast_is_enrolled(row, context):
+    return row['id'] in (context.get('enrolled_class_ids') or ())
+
+
+def fast_trainer_info(row, context):
+    if row['trainer_name'] is None:
+        return None
+    return {
+        'id': row['trainer_id'],
+        'full_name': row['trainer_name'],
+        'specialization': row['trainer_specialization']
+    }
+
+
+class ClassSerializer(DynamicFieldsMixin, ModelSerializer):
     is_enrolled = serializers.SerializerMethodField()
     trainer_info = serializers.SerializerMethodField()
 
+    # Cột cần lấy và hàm tính tương ứng cho đường serialize nhanh (fast_serializers)
+    fast_method_fields = {
+        'is_enrolled': (['id'], fast_is_enrolled),
+        'trainer_info': (['trainer_id', 'trainer_name', 'trainer_specialization'], fast_trainer_info),
+    }
+
     class Meta:
         model = Class
         fields = [
@@ -33,23 +79,31 @@ class ClassSerializer(ModelSerializer):
         ]
 
     def get_is_enrolled(self, obj):
+        # View đã nạp sẵn danh sách lớp hội viên đăng ký cho cả trang
+        enrolled_class_ids = self.context.get('enrolled_class_ids')
+        if enrolled_class_ids is not None:
+            return obj.id in enrolled_class_ids
+
         request = self.context.get('request')
         user = request.user if request else None
 
         if user and user.is_authenticated and user.role == 'member':
-            try:
-                member = Member.objects.get(pk=user.pk)  # dùng kế thừa đa bảng
-                return Enrollment.objects.filter(
-                    member=member,
-                    gym_class=obj,
-                    status='approved'
-                ).exists()
-            except Member.DoesNotExist:
-                return False
+            # Member dùng chung khóa chính với User (kế thừa đa bảng)
+            return Enrollment.objects.filter(
+                member_id=user.pk,
+                gym_class=obj,
+                status='approved'
+            ).exists()
 
         return False
 
     def get_trainer_info(self, obj):
+        if obj.trainer_name is not None:
+            return {
+                'id': obj.trainer_id,
+                'full_name': obj.trainer_name,
+                'specialization': obj.trainer_specialization
+            }
         if obj.trainer:
             return {
                 'id': obj.trainer.id,
@@ -58,15 +112,20 @@ class ClassSerializer(ModelSerializer):
             }
         return None
 
-class TrainerSerializer(ModelSerializer):
+class TrainerSerializer(DynamicFieldsMixin, ModelSerializer):
     class Meta:
         model = Trainer
-        fields = '__all__'
+        fields = USER_PUBLIC_FIELDS + ['specialization', 'experience_years']
 
 
 class UserSerializer(serializers.ModelSerializer):
     username = serializers.CharField(validators=[UniqueValidator(queryset=User.objects.all())])
 
+    # Tương đương to_representation bên dưới cho đường serialize nhanh
+    fast_value_overrides = {
+        'avatar': lambda avatar: avatar.url if avatar else '',
+    }
+
     class Meta:
         model = User
         fields = ['id', 'first_name', 'last_name', 'username', 'password', 'avatar', 'phone', 'email', 'role']
@@ -100,21 +159,26 @@ class UserSerializer(serializers.ModelSerializer):
         d['avatar'] = instance.avatar.url if instance.avatar else ''
         return d
 
-class MemberSerializer(serializers.ModelSerializer):
+class MemberSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Member
-        fields = '__all__'
+        fields = USER_PUBLIC_FIELDS + ['payment_status', 'join_date', 'cancellation_date']
 
-class ReceptionistSerializer(serializers.ModelSerializer):
+class ReceptionistSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Receptionist
-        fields = '__all__'
+        fields = USER_PUBLIC_FIELDS + ['work_shift']
+
+# Chỉ đăng ký được vào lớp còn hoạt động và chưa bị xóa mềm
+ENROLLABLE_CLASSES = Class.objects.filter(active=True, deleted_at__isnull=True)
+
 
-class EnrollmentSerializer(serializers.ModelSerializer):
+class EnrollmentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     member = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.filter(role='member'),
         required=False
     )
+    gym_class = serializers.PrimaryKeyRelatedField(queryset=ENROLLABLE_CLASSES)
     member_detail = UserSerializer(source='member', read_only=True)
     class_detail = ClassSerializer(source='gym_class', read_only=True)
 
@@ -128,12 +192,18 @@ class EnrollmentSerializer(serializers.ModelSerializer):
             'gym_class',
             'class_detail',
         ]
+        # Không dùng UniqueTogetherValidator (nó bắt buộc trường member, trong khi hội viên tự đăng ký
+        # không gửi member); trùng lặp do ràng buộc CSDL chặn và perform_create trả về 400
+        validators = []
 
     def validate(self, data):
-        user = self.context['request'].user
+        request = self.context['request']
+        user = request.user
 
         if user.role == 'member':
-            data['member'] = user.member
+            data['member'] = get_role_user(request)
+            if data['member'] is None:
+                raise serializers.ValidationError("Người dùng này không phải là hội viên.")
         elif user.role == 'receptionist':
             if 'member' not in data:
                 raise serializers.ValidationError("Receptionist phải chỉ định học viên.")
@@ -148,27 +218,60 @@ class EnrollmentSerializer(serializers.ModelSerializer):
         return data
 
 
-class ProgressSerializer(serializers.ModelSerializer):
+class EnrollmentBulkSerializer(serializers.Serializer):
+    """
+    Dữ liệu cho POST /enrollments/bulk/: đăng ký nhiều học viên vào một lớp.
+    """
+    MAX_MEMBERS = 500
+
+    gym_class = serializers.PrimaryKeyRelatedField(queryset=ENROLLABLE_CLASSES)
+    members = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=MAX_MEMBERS)
+    status = serializers.ChoiceField(choices=Enrollment.STATUSES, required=False, default='approved')
+
+    def validate_members(self, value):
+        # Bỏ id trùng nhưng giữ thứ tự gửi lên để kết quả trả về khớp với request
+        return list(dict.fromkeys(value))
+
+
+class ProgressSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Progress
         fields = '__all__'
 
-class AppointmentSerializer(serializers.ModelSerializer):
+class AppointmentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Appointment
         fields = '__all__'
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = '__all__'
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = '__all__'
+        # batch_key chỉ do fan-out gán; để chỉ đọc thì DRF không sinh UniqueTogetherValidator bắt buộc trường này
+        read_only_fields = ['batch_key']
+
+class NotificationFanOutSerializer(serializers.Serializer):
+    """
+    Dữ liệu cho POST /notifications/fan-out/: gửi tới học viên của một lớp hoặc một nhóm hội viên.
+    """
+    message = serializers.CharField()
+    type = serializers.ChoiceField(choices=Notification.NOTIFICATION_TYPES)
+    gym_class = serializers.PrimaryKeyRelatedField(queryset=Class.objects.all(), required=False)
+    segment = serializers.ChoiceField(choices=list(MEMBER_SEGMENTS), required=False)
+    batch_key = serializers.RegexField(r'^[\w-]{1,64}$', required=False)
+
+    def validate(self, data):
+        if ('gym_class' in data) == ('segment' in data):
+            raise serializers.ValidationError("Phải chọn đúng một trong hai: gym_class hoặc segment.")
+        return data
+
 
-class InternalNewsSerializer(serializers.ModelSerializer):
+class InternalNewsSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     author_name = serializers.SerializerMethodField()
 
     class Meta:
@@ -179,7 +282,25 @@ class InternalNewsSerializer(serializers.ModelSerializer):
         return f"{obj.author.first_name} {obj.author.last_name}"
 
 
-class StatisticSerializer(serializers.ModelSerializer):
+class StatisticSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Statistic
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+
+class ExportJobSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    date_from = serializers.DateField(write_only=True, required=False)
+    date_to = serializers.DateField(write_only=True, required=False)
+    pks = serializers.ListField(child=serializers.IntegerField(), write_only=True, required=False)
+
+    class Meta:
+        model = ExportJob
+        fields = ['id', 'kind', 'status', 'params', 'files', 'row_count', 'error',
+                  'created_date', 'finished_at', 'date_from', 'date_to', 'pks']
+        read_only_fields = ['status', 'params', 'files', 'row_count', 'error', 'created_date', 'finished_at']
+
+    def create(self, validated_data):
+        params = {key: validated_data[key].isoformat() for key in ('date_from', 'date_to') if key in validated_data}
+        if validated_data.get('pks'):
+            params['pks'] = validated_data['pks']
+        return enqueue_export(validated_data['kind'], params, self.context['request'].user)
@@ -0,0 +1,122 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from oauth2_provider.models import get_access_token_model
+from .authentication import forget_role_user, forget_tokens
+from .notifications import adjust_unread_count, forget_unread_counts
+from .models import User, Member, Trainer, Receptionist, Payment, Enrollment, Class, Notification, Tombstone
+from .stats import bump_stats_version, mark_statistics_dirty
+
+AccessToken = get_access_token_model()
+
+
+STATS_SOURCE_MODELS = {
+    Member: 'members',
+    Payment: 'payments',
+    Enrollment: 'enrollments',
+    Class: 'classes',
+}
+
+
+@receiver([post_save, post_delete])
+def invalidate_stats_cache(sender, **kwargs):
+    source = STATS_SOURCE_MODELS.get(sender)
+    if source:
+        bump_stats_version(source)
+
+
+def trainer_display_name(trainer):
+    return f"{trainer.first_name} {trainer.last_name}"
+
+
+@receiver(pre_save, sender=Class)
+def copy_trainer_summary(sender, instance, **kwargs):
+    if not instance.trainer_id:
+        instance.trainer_name = instance.trainer_specialization = None
+        return
+    if Class.trainer.is_cached(instance):
+        trainer = instance.trainer
+    else:
+        trainer = Trainer.objects.only('first_name', 'last_name', 'specialization').get(pk=instance.trainer_id)
+    instance.trainer_name = trainer_display_name(trainer)
+    instance.trainer_specialization = trainer.specialization
+
+
+TRAINER_SUMMARY_FIELDS = {'first_name', 'last_name', 'specialization'}
+
+
+@receiver(post_save, sender=Trainer)
+@receiver(post_save, sender=User)
+def sync_trainer_summary(sender, instance, created, update_fields=None, **kwargs):
+    # Trainer mới chưa có lớp; save(update_fields=...) không đụng tới tên/chuyên môn (last_login...) thì bỏ qua
+    if created or (update_fields is not None and not TRAINER_SUMMARY_FIELDS & set(update_fields)):
+        return
+    if isinstance(instance, Trainer):
+        summary = {'trainer_name': trainer_display_name(instance), 'trainer_specialization': instance.specialization}
+    elif instance.role == 'trainer':
+        summary = {'trainer_name': trainer_display_name(instance)}
+    else:
+        return
+    # Chỉ ghi các lớp có bản sao đã cũ: lưu mà tên/chuyên môn không đổi thì không dòng nào bị cập nhật
+    # (updated_date giữ nguyên nên ETag và ?since= của /classes/ không bị làm mới vô ích)
+    Class.objects.filter(trainer_id=instance.pk).exclude(**summary).update(**summary, updated_date=timezone.now())
+
+
+@receiver(post_save, sender=Notification)
+def count_saved_notification(sender, instance, created, **kwargs):
+    if created:
+        if not instance.is_read:
+            adjust_unread_count(instance.member_id, 1)
+    else:
+        # Không biết trạng thái trước khi sửa (ví dụ trong admin): đếm lại ở lần đọc sau
+        forget_unread_counts([instance.member_id])
+
+
+@receiver(post_delete, sender=Notification)
+def count_deleted_notification(sender, instance, **kwargs):
+    if not instance.is_read:
+        adjust_unread_count(instance.member_id, -1)
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=Member)
+@receiver([post_save, post_delete], sender=Trainer)
+@receiver([post_save, post_delete], sender=Receptionist)
+def invalidate_role_user(sender, instance, **kwargs):
+    forget_role_user(instance.pk)
+    # Token đã cache giữ bản sao của user: xóa để request sau đọc lại dữ liệu mới
+    forget_tokens(AccessToken.objects.filter(user_id=instance.pk).values_list('token', flat=True))
+
+
+@receiver([post_save, post_delete], sender=AccessToken)
+def invalidate_access_token(sender, instance, **kwargs):
+    # Thu hồi token (revoke_token, làm mới token) sẽ xóa dòng AccessToken
+    forget_tokens([instance.token])
+
+
+@receiver(post_delete, sender=Class)
+@receiver(post_delete, sender=Enrollment)
+@receiver(post_delete, sender=Notification)
+def record_tombstone(sender, instance, **kwargs):
+    Tombstone.objects.create(
+        kind=sender._meta.model_name,
+        object_id=instance.pk,
+        owner_id=getattr(instance, 'member_id', None),
+        class_id=getattr(instance, 'gym_class_id', None)
+    )
+
+
+@receiver([post_save, post_delete], sender=Payment)
+def mark_payment_statistics(sender, instance, **kwargs):
+    # Payment không có dấu thời gian cập nhật: đổi trạng thái/xóa thanh toán cũ phải được ghi lại
+    mark_statistics_dirty(instance.date_paid)
+
+
+@receiver(post_delete, sender=Enrollment)
+def mark_enrollment_statistics(sender, instance, **kwargs):
+    mark_statistics_dirty(instance.created_date)
+
+
+@receiver(post_delete, sender=Member)
+def mark_member_statistics(sender, instance, **kwargs):
+    mark_statistics_dirty(instance.join_date, instance.cancellation_date)
@@ -1,3 +1,1116 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time as clock
+from unittest import mock
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.db import close_old_connections, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from oauth2_provider.models import AccessToken, Application
+from sportscenters.authentication import resolve_role_user
+from sportscenters.exports import ENROLLMENT_EXPORT
+from sportscenters.models import (
+    User, Member, Trainer, Receptionist, Class, Enrollment, Notification, Payment, Statistic, Tombstone, ExportJob
+)
+from sportscenters.notifications import fan_out, get_unread_count
+from sportscenters.fast_serializers import CompiledSerializer
+from sportscenters.views import (
+    StatisticViewSet, ClassViewSet, EnrollmentViewSet, PaymentViewSet, NotificationViewSet, TrainerClassListView
+)
+from sportscenters.stats import (
+    rollup_statistics, period_floor, cached_stats, acquire_stats_lock, release_stats_lock, stats_cache,
+    snapshot_series, compute_member_stats, day_start
+)
 
-# Create your tests here.
+# Cache trong bộ nhớ, tách khỏi thư mục cache thật của dự án
+TEST_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'test-{alias}'}
+    for alias in ('default', 'stats', 'auth')
+}
+
+
+class FixturesMixin:
+    def create_trainer(self, username='trainer'):
+        return Trainer.objects.create(username=username, first_name='Huấn', last_name='Luyện',
+                                      specialization='yoga', experience_years=3)
+
+    def create_member(self, username='member'):
+        return Member.objects.create(username=username, full_name=username, role='member', payment_status='paid')
+
+    def create_receptionist(self, username='receptionist'):
+        return Receptionist.objects.create(username=username, role='receptionist', work_shift='morning')
+
+    def create_class(self, trainer, name='Yoga', max_members=10, **kwargs):
+        now = timezone.now()
+        kwargs.setdefault('start_time', now)
+        kwargs.setdefault('end_time', now + timedelta(hours=1))
+        return Class.objects.create(name=name, description='', trainer=trainer, max_members=max_members,
+                                    status='active', price=Decimal('100000'), **kwargs)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        return client
+
+
+@override_settings(CACHES=TEST_CACHES)
+class EnrollmentCreateTests(FixturesMixin, TestCase):
+    def setUp(self):
+        self.trainer = self.create_trainer()
+        self.member = self.create_member()
+        self.gym_class = self.create_class(self.trainer)
+
+    def test_member_enrolls_without_member_field(self):
+        # Payload của app: chỉ có gym_class
+        response = self.client_for(self.member).post('/enrollments/', {'gym_class': self.gym_class.pk}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertTrue(Enrollment.objects.filter(member=self.member, gym_class=self.gym_class).exists())
+        self.gym_class.refresh_from_db()
+        self.assertEqual(self.gym_class.current_capacity, 1)
+
+    def test_update_onto_existing_pair_is_rejected(self):
+        other_class = self.create_class(self.trainer, name='Boxing')
+        Enrollment.objects.create(member=self.member, gym_class=self.gym_class)
+        moved = Enrollment.objects.create(member=self.member, gym_class=other_class)
+        response = self.client_for(self.create_receptionist()).patch(
+            f'/enrollments/{moved.pk}/', {'member': self.member.pk, 'gym_class': self.gym_class.pk}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        moved.refresh_from_db()
+        self.assertEqual(moved.gym_class_id, other_class.pk)
+
+    def test_duplicate_enrollment_is_rejected(self):
+        client = self.client_for(self.member)
+        client.post('/enrollments/', {'gym_class': self.gym_class.pk}, format='json')
+        response = client.post('/enrollments/', {'gym_class': self.gym_class.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Enrollment.objects.filter(member=self.member).count(), 1)
+        self.gym_class.refresh_from_db()
+        self.assertEqual(self.gym_class.current_capacity, 1)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ConcurrentEnrollmentTests(FixturesMixin, TransactionTestCase):
+    """
+    Hai request đăng ký cùng lúc đều qua được bước kiểm tra tồn tại; ràng buộc duy nhất
+    phải giữ lại đúng một đăng ký và sĩ số chỉ tăng một lần.
+    """
+
+    def test_concurrent_duplicate_enroll(self):
+        trainer = self.create_trainer()
+        member = self.create_member()
+        gym_class = self.create_class(trainer)
+        barrier = threading.Barrier(2)
+        statuses = []
+        original_exists = type(Enrollment.objects.all()).exists
+
+        def exists_after_both_checked(queryset):
+            result = original_exists(queryset)
+            # Cả hai luồng cùng thấy "chưa đăng ký" trước khi bất kỳ luồng nào ghi
+            barrier.wait(timeout=10)
+            return result
+
+        def enroll():
+            try:
+                response = self.client_for(member).post('/enrollments/', {'gym_class': gym_class.pk}, format='json')
+                statuses.append(response.status_code)
+            finally:
+                close_old_connections()
+
+        with mock.patch.object(type(Enrollment.objects.all()), 'exists', exists_after_both_checked):
+            threads = [threading.Thread(target=enroll) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(sorted(statuses), [201, 400])
+        self.assertEqual(Enrollment.objects.filter(member=member, gym_class=gym_class).count(), 1)
+        gym_class.refresh_from_db()
+        self.assertEqual(gym_class.current_capacity, 1)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class EnrollmentBulkTests(FixturesMixin, TestCase):
+    def setUp(self):
+        self.trainer = self.create_trainer()
+        self.client = self.client_for(self.create_receptionist())
+        self.members = [self.create_member(f'member{i}') for i in range(4)]
+
+    def post_bulk(self, gym_class, member_ids, **extra):
+        return self.client.post('/enrollments/bulk/', {'gym_class': gym_class.pk, 'members': member_ids, **extra},
+                                format='json')
+
+    def test_mixed_outcomes_and_capacity_limit(self):
+        gym_class = self.create_class(self.trainer, max_members=3)
+        first, second, third, fourth = self.members
+        Enrollment.objects.create(member=first, gym_class=gym_class)
+        gym_class.current_capacity = 1
+        gym_class.save()
+
+        response = self.post_bulk(gym_class, [first.pk, second.pk, self.trainer.pk, third.pk, fourth.pk, second.pk])
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['created'], 2)
+        outcomes = [(item['member'], item['status']) for item in response.data['results']]
+        self.assertEqual(outcomes, [
+            (first.pk, 'duplicate'), (second.pk, 'created'), (self.trainer.pk, 'not_member'),
+            (third.pk, 'created'), (fourth.pk, 'class_full'),
+        ])
+
+        gym_class.refresh_from_db()
+        self.assertEqual(gym_class.current_capacity, 3)
+        self.assertEqual(
+            set(Enrollment.objects.filter(gym_class=gym_class).values_list('member_id', flat=True)),
+            {first.pk, second.pk, third.pk}
+        )
+        created = {item['member']: item['enrollment'] for item in response.data['results'] if item['status'] == 'created'}
+        self.assertEqual(Enrollment.objects.get(pk=created[third.pk]).member_id, third.pk)
+
+    def test_full_class_returns_400_without_changes(self):
+        gym_class = self.create_class(self.trainer, max_members=0)
+        response = self.post_bulk(gym_class, [member.pk for member in self.members])
+        self.assertEqual(response.status_code, 400, response.data)
+        self.assertEqual({item['status'] for item in response.data['results']}, {'class_full'})
+        self.assertFalse(Enrollment.objects.exists())
+
+    def test_status_must_be_an_enrollment_status(self):
+        gym_class = self.create_class(self.trainer)
+        response = self.post_bulk(gym_class, [self.members[0].pk], status='whatever')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('status', response.data)
+
+        response = self.post_bulk(gym_class, [self.members[0].pk], status='pending')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Enrollment.objects.get().status, 'pending')
+
+    def test_deleted_or_inactive_class_is_rejected(self):
+        deleted = self.create_class(self.trainer, name='Deleted', deleted_at=timezone.now())
+        inactive = self.create_class(self.trainer, name='Inactive', active=False)
+        for gym_class in (deleted, inactive):
+            response = self.post_bulk(gym_class, [self.members[0].pk])
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('gym_class', response.data)
+
+            # Đăng ký lẻ cũng bị chặn như vậy
+            response = self.client.post('/enrollments/', {'gym_class': gym_class.pk, 'member': self.members[0].pk},
+                                        format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('gym_class', response.data)
+        self.assertFalse(Enrollment.objects.exists())
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CapacityStressTests(FixturesMixin, TransactionTestCase):
+    """
+    Nhiều hội viên khác nhau cùng đăng ký một lớp còn ít chỗ hơn số người: không được bán vượt chỗ.
+    """
+
+    def test_concurrent_members_never_oversell(self):
+        workers, max_members = 8, 3
+        gym_class = self.create_class(self.create_trainer(), max_members=max_members)
+        members = [self.create_member(f'member{i}') for i in range(workers)]
+        barrier = threading.Barrier(workers)
+        statuses = []
+
+        def enroll(member):
+            try:
+                client = self.client_for(member)
+                barrier.wait(timeout=10)
+                response = client.post('/enrollments/', {'gym_class': gym_class.pk}, format='json')
+                statuses.append(response.status_code)
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=enroll, args=(member,)) for member in members]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(statuses), [201] * max_members + [400] * (workers - max_members))
+        gym_class.refresh_from_db()
+        self.assertEqual(gym_class.current_capacity, max_members)
+        self.assertEqual(Enrollment.objects.filter(gym_class=gym_class, status='approved').count(), max_members)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class NotificationCreateTests(FixturesMixin, TestCase):
+    def test_create_without_batch_key(self):
+        member = self.create_member()
+        staff = self.create_receptionist()
+        response = self.client_for(staff).post('/notifications/', {
+            'member': member.pk, 'message': 'Lịch học thay đổi', 'type': 'class_schedule'
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertIsNone(Notification.objects.get(pk=response.data['id']).batch_key)
+
+    def test_batch_key_is_not_writable(self):
+        member = self.create_member()
+        staff = self.create_receptionist()
+        response = self.client_for(staff).post('/notifications/', {
+            'member': member.pk, 'message': 'Khuyến mãi', 'type': 'promotion', 'batch_key': 'abc'
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertIsNone(Notification.objects.get(pk=response.data['id']).batch_key)
+
+    def test_unread_count_follows_reads_and_deletes(self):
+        self.check_unread_count_flow()
+
+    def check_unread_count_flow(self):
+        member = self.create_member()
+        client = self.client_for(member)
+        with self.captureOnCommitCallbacks(execute=True):
+            first, second = (Notification.objects.create(member=member, message=str(i), type='promotion') for i in range(2))
+        self.assertEqual(client.get('/notifications/unread-count/').data['unread_count'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post(f'/notifications/{first.pk}/mark-read/')
+            client.post(f'/notifications/{first.pk}/mark-read/')
+        self.assertEqual(client.get('/notifications/unread-count/').data['unread_count'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            fan_out('Nghỉ lễ', 'promotion', 'batch-1', segment='all')
+        self.assertEqual(client.get('/notifications/unread-count/').data['unread_count'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+            client.post('/notifications/mark-all-read/')
+        self.assertEqual(client.get('/notifications/unread-count/').data['unread_count'], 0)
+        return member
+
+    @override_settings(
+        CACHES=dict(TEST_CACHES, counters={'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                           'LOCATION': 'test-counters'}),
+        COUNTERS_CACHE_ALIAS='counters',
+    )
+    def test_unread_count_is_served_from_counter(self):
+        caches['counters'].clear()
+        member = self.check_unread_count_flow()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.create(member=member, message='Mới', type='promotion')
+        self.assertEqual(caches['counters'].get(f'notifications:unread:{member.pk}'), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_count(member.pk), 1)
+
+        # Mất khóa trong cache thì đếm lại từ index
+        caches['counters'].clear()
+        self.assertEqual(get_unread_count(member.pk), 1)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class RollupStatisticsTests(FixturesMixin, TestCase):
+    """
+    Thay đổi không để lại dấu thời gian (thanh toán đổi trạng thái, đăng ký bị xóa hẳn)
+    ở kỳ đã đóng vẫn phải được rollup lần sau tính lại.
+    """
+
+    def test_untimestamped_changes_in_closed_period_are_recomputed(self):
+        past = timezone.now() - timedelta(days=120)
+        period_start = period_floor(past.date(), 'monthly')
+        member = self.create_member()
+        Member.objects.filter(pk=member.pk).update(join_date=past.date())
+        enrollment = Enrollment.objects.create(member=member, gym_class=self.create_class(self.create_trainer()))
+        Enrollment.objects.filter(pk=enrollment.pk).update(created_date=past, updated_date=past)
+        payment = Payment.objects.create(member=member, amount=Decimal('500000'), payment_method='momo',
+                                         status='pending', transaction_id='tx-1')
+        Payment.objects.filter(pk=payment.pk).update(date_paid=past)
+
+        rollup_statistics('monthly')
+        snapshot = Statistic.objects.get(period_type='monthly', period_start=period_start, class_id__isnull=True)
+        self.assertEqual(snapshot.enrollment_count, 1)
+        self.assertEqual(snapshot.total_revenue, 0)
+
+        payment.refresh_from_db()
+        payment.status = 'success'
+        payment.save()
+        Enrollment.objects.get(pk=enrollment.pk).delete()
+
+        self.assertGreater(rollup_statistics('monthly'), 0)
+        snapshot = Statistic.objects.get(period_type='monthly', period_start=period_start, class_id__isnull=True)
+        self.assertEqual(snapshot.enrollment_count, 0)
+        self.assertEqual(snapshot.total_revenue, Decimal('500000'))
+
+
+def at(day):
+    return timezone.make_aware(datetime.combine(day, time(10)))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class MemberRevenueStatsTests(FixturesMixin, TestCase):
+    """
+    Giá trị từng kỳ của /stats/members/ và /stats/revenue/ (kỳ theo lịch, tính trực tiếp khi chưa có snapshot).
+    """
+
+    def setUp(self):
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+        self.client = APIClient()
+
+    def create_member_joined(self, username, join_date, **kwargs):
+        member = self.create_member(username)
+        Member.objects.filter(pk=member.pk).update(join_date=join_date, **kwargs)
+        return member
+
+    def test_member_stats_per_bucket(self):
+        self.create_member_joined('before', date(2024, 12, 10))
+        self.create_member_joined('january', date(2025, 1, 5))
+        self.create_member_joined('left', date(2025, 2, 14), active=False, cancellation_date=date(2025, 3, 2))
+        self.create_member_joined('february', date(2025, 2, 20))
+
+        response = self.client.get('/stats/members/', {'period': 'monthly', 'start_date': '2025-01-01',
+                                                       'end_date': '2025-03-31'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([
+            (row['period_start'], row['period_end'], row['member_count'], row['new_members'], row['cancelled_members'])
+            for row in response.data
+        ], [
+            (date(2025, 1, 1), date(2025, 1, 31), 2, 1, 0),
+            (date(2025, 2, 1), date(2025, 2, 28), 3, 2, 0),
+            (date(2025, 3, 1), date(2025, 3, 31), 3, 0, 1),
+        ])
+
+        # Tuần theo lịch bắt đầu từ thứ Hai, không phải các khoảng 7 ngày tính từ start_date
+        response = self.client.get('/stats/members/', {'period': 'weekly', 'start_date': '2025-01-01',
+                                                       'end_date': '2025-01-14'})
+        self.assertEqual([(row['period_start'], row['new_members']) for row in response.data], [
+            (date(2024, 12, 30), 1), (date(2025, 1, 6), 0), (date(2025, 1, 13), 0),
+        ])
+
+    def test_member_stats_query_count_does_not_grow_with_periods(self):
+        self.create_member_joined('january', date(2025, 1, 5))
+        # Một truy vấn snapshot và hai truy vấn nhóm (tham gia, hủy), dù có 53 tuần
+        with self.assertNumQueries(3):
+            stats = snapshot_series('weekly', date(2025, 1, 1), date(2025, 12, 31),
+                                    ('member_count', 'new_members', 'cancelled_members'), compute_member_stats)
+        self.assertEqual(len(stats), 53)
+
+    def test_revenue_stats_per_bucket(self):
+        member = self.create_member()
+        for amount, status, day in [
+            ('100000', 'success', date(2025, 1, 15)),
+            ('50000', 'failed', date(2025, 1, 20)),
+            ('200000', 'success', date(2025, 3, 1)),
+            ('300000', 'success', date(2025, 3, 31)),
+            ('900000', 'success', date(2025, 4, 1)),
+        ]:
+            payment = Payment.objects.create(member=member, amount=Decimal(amount), payment_method='momo',
+                                             status=status, transaction_id=f'tx-{day}')
+            Payment.objects.filter(pk=payment.pk).update(date_paid=at(day))
+
+        response = self.client.get('/stats/revenue/', {'period': 'monthly', 'start_date': '2025-01-01',
+                                                       'end_date': '2025-03-31'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(row['period_start'], row['total_revenue']) for row in response.data], [
+            (date(2025, 1, 1), Decimal('100000')), (date(2025, 2, 1), 0), (date(2025, 3, 1), Decimal('500000')),
+        ])
+
+
+class ClassStatsDataMixin(FixturesMixin):
+    """
+    Lớp A (4 chỗ, cả năm 2025) và lớp B (2 chỗ, chỉ tháng 2) của hai huấn luyện viên, lớp C đã xóa mềm.
+    """
+
+    def setUp(self):
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+        self.client = APIClient()
+        self.trainer = self.create_trainer()
+        self.other_trainer = self.create_trainer('other_trainer')
+        self.class_a = self.create_class(self.trainer, name='A', max_members=4,
+                                         start_time=at(date(2025, 1, 1)), end_time=at(date(2025, 12, 31)))
+        self.class_b = self.create_class(self.other_trainer, name='B', max_members=2,
+                                         start_time=at(date(2025, 2, 1)), end_time=at(date(2025, 2, 28)))
+        self.class_c = self.create_class(self.trainer, name='C', start_time=at(date(2025, 1, 1)),
+                                         end_time=at(date(2025, 12, 31)), deleted_at=timezone.now())
+        for gym_class, day, enrollment_status in [
+            (self.class_a, date(2024, 12, 20), 'approved'),
+            (self.class_a, date(2025, 1, 10), 'approved'),
+            (self.class_a, date(2025, 2, 3), 'approved'),
+            (self.class_a, date(2025, 2, 15), 'pending'),
+            (self.class_b, date(2025, 2, 10), 'approved'),
+            (self.class_c, date(2025, 1, 12), 'approved'),
+        ]:
+            self.enroll(gym_class, day, enrollment_status)
+
+    def enroll(self, gym_class, day, enrollment_status='approved'):
+        member = self.create_member(f'member{Member.objects.count()}')
+        enrollment = Enrollment.objects.create(member=member, gym_class=gym_class, status=enrollment_status)
+        Enrollment.objects.filter(pk=enrollment.pk).update(created_date=at(day))
+        return member
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ClassMemberStatsTests(ClassStatsDataMixin, TestCase):
+    def get_stats(self, **params):
+        response = self.client.get('/stats/class-members/', {'period': 'monthly', 'start_date': '2025-01-01',
+                                                             'end_date': '2025-03-31', **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['data']
+
+    def test_class_member_stats_per_bucket(self):
+        stats = self.get_stats()
+        self.assertEqual([
+            (row['period_start'], row['total_classes'], row['total_new_enrollments'], row['average_occupancy_rate'])
+            for row in stats
+        ], [
+            (date(2025, 1, 1), 1, 1, 50.0),
+            (date(2025, 2, 1), 2, 2, 62.5),
+            (date(2025, 3, 1), 1, 0, 75.0),
+        ])
+        # Sĩ số cộng dồn cả enrollment trước kỳ đầu; enrollment pending và lớp đã xóa không được tính
+        self.assertEqual([
+            [(item['class_id'], item['current_members'], item['new_enrollments'], item['occupancy_rate'])
+             for item in row['classes']]
+            for row in stats
+        ], [
+            [(self.class_a.pk, 2, 1, 50.0)],
+            [(self.class_a.pk, 3, 1, 75.0), (self.class_b.pk, 1, 1, 50.0)],
+            [(self.class_a.pk, 3, 0, 75.0)],
+        ])
+
+    def test_class_and_trainer_filters(self):
+        stats = self.get_stats(trainer_id=self.other_trainer.pk)
+        self.assertEqual([[item['class_id'] for item in row['classes']] for row in stats], [[], [self.class_b.pk], []])
+
+        stats = self.get_stats(class_id=self.class_a.pk)
+        self.assertEqual([[item['class_id'] for item in row['classes']] for row in stats],
+                         [[self.class_a.pk]] * 3)
+
+    def test_query_count_does_not_grow_with_periods_or_classes(self):
+        for i in range(5):
+            self.create_class(self.trainer, name=f'Extra {i}', start_time=at(date(2025, 1, 1)),
+                              end_time=at(date(2025, 12, 31)))
+        # Một truy vấn lớp học (kèm huấn luyện viên), một truy vấn enrollment nhóm theo (lớp, kỳ)
+        with self.assertNumQueries(2):
+            stats = StatisticViewSet().compute_class_member_stats('weekly', at(date(2025, 1, 1)), at(date(2025, 12, 31)))
+        self.assertEqual(len(stats), 53)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ClassStatsTests(ClassStatsDataMixin, TestCase):
+    def test_class_stats_per_bucket(self):
+        response = self.client.get('/stats/classes/', {'period': 'monthly', 'start_date': '2025-01-01',
+                                                       'end_date': '2025-03-31'})
+        self.assertEqual(response.status_code, 200)
+        stats = {row['class_id']: row for row in response.data}
+        self.assertEqual(stats[self.class_a.pk]['total_enrollments'], 3)
+        self.assertEqual([(p['period_start'], p['period_end'], p['enrollments']) for p in stats[self.class_a.pk]['periods']], [
+            (date(2025, 1, 1), date(2025, 1, 31), 1), (date(2025, 2, 1), date(2025, 2, 28), 2),
+        ])
+        self.assertEqual([(p['period_start'], p['enrollments']) for p in stats[self.class_b.pk]['periods']],
+                         [(date(2025, 2, 1), 1)])
+        self.assertEqual(stats[self.class_c.pk]['total_enrollments'], 1)
+
+    def test_query_count_does_not_grow_with_classes(self):
+        for i in range(5):
+            self.enroll(self.create_class(self.trainer, name=f'Extra {i}'), date(2025, 1, 20))
+        # Hai truy vấn snapshot, một truy vấn enrollment nhóm theo (lớp, kỳ), một truy vấn tên lớp
+        with self.assertNumQueries(4):
+            stats = StatisticViewSet().compute_class_stats('weekly', at(date(2025, 1, 1)), at(date(2025, 12, 31)))
+        self.assertEqual(len(stats), 8)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ClassPerformanceTests(FixturesMixin, TestCase):
+    """
+    Số enrollment và doanh thu trong kỳ hiện tại là hai subquery riêng: không bị nhân chéo enrollment × payment.
+    """
+
+    def setUp(self):
+        trainer = self.create_trainer()
+        self.since = day_start(period_floor(timezone.now(), 'monthly'))
+        self.class_a = self.create_class(trainer, name='A', max_members=4, current_capacity=2)
+        self.class_b = self.create_class(trainer, name='B', max_members=2, current_capacity=1)
+        self.create_class(trainer, name='Deleted', deleted_at=timezone.now())
+        first, second, old, pending = (self.create_member(f'member{i}') for i in range(4))
+
+        Enrollment.objects.create(member=first, gym_class=self.class_a)
+        Enrollment.objects.create(member=first, gym_class=self.class_b)
+        Enrollment.objects.create(member=second, gym_class=self.class_a)
+        Enrollment.objects.create(member=pending, gym_class=self.class_a, status='pending')
+        enrollment = Enrollment.objects.create(member=old, gym_class=self.class_a)
+        Enrollment.objects.filter(pk=enrollment.pk).update(created_date=self.since - timedelta(days=1))
+
+        for member, amount, payment_status, date_paid in [
+            (first, '100000', 'success', None),
+            (second, '200000', 'success', None),
+            (second, '50000', 'failed', None),
+            (second, '400000', 'success', self.since - timedelta(days=1)),
+            (pending, '700000', 'success', None),
+        ]:
+            payment = Payment.objects.create(member=member, amount=Decimal(amount), payment_method='momo',
+                                             status=payment_status, transaction_id=f'tx-{Payment.objects.count()}')
+            if date_paid:
+                Payment.objects.filter(pk=payment.pk).update(date_paid=date_paid)
+
+    def test_metrics_per_class_in_current_period(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().get('/stats/class-performance/', {'period': 'monthly'})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual([
+            (row['id'], row['total_enrollments'], row['total_revenue'], row['avg_occupancy'])
+            for row in response.data['data']
+        ], [
+            (self.class_a.pk, 2, Decimal('300000'), 50.0),
+            (self.class_b.pk, 1, Decimal('100000'), 50.0),
+        ])
+        # Cả hai chỉ số là subquery trong cùng một truy vấn lớp học
+        self.assertEqual(len(queries), 1)
+
+    def test_invalid_period_is_rejected(self):
+        response = APIClient().get('/stats/class-performance/', {'period': 'daily'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ClassListConditionalGetTests(FixturesMixin, TestCase):
+    """
+    is_enrolled phụ thuộc đăng ký của người gọi: đăng ký/hủy phải làm ETag của /classes/ thay đổi.
+    """
+
+    def test_etag_changes_when_caller_enrolls_or_unenrolls(self):
+        member = self.create_member()
+        gym_class = self.create_class(self.create_trainer())
+        client = self.client_for(member)
+        etag = client.get('/classes/')['ETag']
+        self.assertEqual(client.get('/classes/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        enrollment = Enrollment.objects.create(member=member, gym_class=gym_class)
+        response = client.get('/classes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['results'][0]['is_enrolled'])
+
+        etag = response['ETag']
+        enrollment.delete()
+        response = client.get('/classes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data['results'][0]['is_enrolled'])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ClassCalendarTests(FixturesMixin, TestCase):
+    def setUp(self):
+        self.member = self.create_member()
+        self.trainer = self.create_trainer()
+
+    def test_same_day_range_covers_whole_day(self):
+        day = timezone.localdate()
+        start = timezone.make_aware(datetime.combine(day, time(18, 0)))
+        gym_class = self.create_class(self.trainer, start_time=start, end_time=start + timedelta(hours=1))
+        self.create_class(self.trainer, name='Hôm sau', start_time=start + timedelta(days=1),
+                          end_time=start + timedelta(days=1, hours=1))
+
+        response = self.client_for(self.member).get('/classes/calendar/', {'from': day.isoformat(), 'to': day.isoformat()})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual([row['id'] for row in response.data['results']], [gym_class.pk])
+
+    def test_invalid_range_is_rejected(self):
+        client = self.client_for(self.member)
+        self.assertEqual(client.get('/classes/calendar/', {'from': 'ngày mai'}).status_code, 400)
+        self.assertEqual(client.get('/classes/calendar/', {'from': '2026-10-18', 'to': '2026-10-17'}).status_code, 400)
+
+    def test_not_modified_when_etag_matches(self):
+        self.create_class(self.trainer)
+        client = self.client_for(self.member)
+        etag = client.get('/classes/calendar/')['ETag']
+        self.assertEqual(client.get('/classes/calendar/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class DeltaSyncTests(FixturesMixin, TestCase):
+    def setUp(self):
+        self.member = self.create_member()
+        self.trainer = self.create_trainer()
+
+    def test_since_returns_changes_and_deletions(self):
+        unchanged = self.create_class(self.trainer, name='Cũ')
+        Class.objects.filter(pk=unchanged.pk).update(updated_date=timezone.now() - timedelta(days=2))
+        since = timezone.now() - timedelta(days=1)
+        changed = self.create_class(self.trainer, name='Mới')
+        soft_deleted = self.create_class(self.trainer, name='Xóa mềm')
+        Class.objects.filter(pk=soft_deleted.pk).update(deleted_at=timezone.now())
+        hard_deleted = self.create_class(self.trainer, name='Xóa hẳn')
+        hard_deleted_pk = hard_deleted.pk
+        hard_deleted.delete()
+
+        response = self.client_for(self.member).get('/classes/', {'since': since.isoformat()})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual([row['id'] for row in response.data['results']], [changed.pk])
+        self.assertEqual(response.data['deleted'], sorted([soft_deleted.pk, hard_deleted_pk]))
+
+    def test_member_only_receives_own_enrollment_tombstones(self):
+        gym_class = self.create_class(self.trainer)
+        other = self.create_member('other')
+        Tombstone.objects.create(kind='enrollment', object_id=1, owner_id=self.member.pk)
+        Tombstone.objects.create(kind='enrollment', object_id=2, owner_id=other.pk)
+        Enrollment.objects.create(member=self.member, gym_class=gym_class)
+
+        response = self.client_for(self.member).get('/enrollments/', {'since': timezone.localdate().isoformat()})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['deleted'], [1])
+
+    def test_trainer_only_receives_tombstones_of_own_classes(self):
+        own_class = self.create_class(self.trainer)
+        other_class = self.create_class(self.create_trainer('other_trainer'), name='Boxing')
+        own = Enrollment.objects.create(member=self.member, gym_class=own_class)
+        foreign = Enrollment.objects.create(member=self.member, gym_class=other_class)
+        own_pk, foreign_pk = own.pk, foreign.pk
+        own.delete()
+        foreign.delete()
+        # Tombstone không có chủ và không gắn lớp (ghi trước khi có class_id) vẫn được gửi cho mọi người
+        Tombstone.objects.create(kind='enrollment', object_id=999)
+
+        since = timezone.localdate().isoformat()
+        response = self.client_for(self.trainer).get('/enrollments/', {'since': since})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['deleted'], [own_pk, 999])
+
+        response = self.client_for(self.create_receptionist()).get('/enrollments/', {'since': since})
+        self.assertEqual(response.data['deleted'], [own_pk, foreign_pk, 999])
+
+    def test_since_too_old_or_invalid(self):
+        client = self.client_for(self.member)
+        self.assertEqual(client.get('/classes/', {'since': '2000-01-01'}).status_code, 410)
+        self.assertEqual(client.get('/classes/', {'since': 'hôm qua'}).status_code, 400)
+
+
+class StatsLockTests(SimpleTestCase):
+    """
+    FileBasedCache.add không nguyên tử: khóa single-flight phải dùng file O_EXCL.
+    """
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        caches = dict(TEST_CACHES, stats={
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': self.cache_dir
+        })
+        settings_override = override_settings(CACHES=caches)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_file_lock_is_exclusive_and_expires(self):
+        self.assertTrue(acquire_stats_lock('stats_lock', 60))
+        self.assertFalse(acquire_stats_lock('stats_lock', 60))
+        release_stats_lock('stats_lock')
+        self.assertTrue(acquire_stats_lock('stats_lock', 60))
+
+        # Khóa của worker đã chết (quá timeout) được lấy lại
+        lock_file = next(name for name in os.listdir(self.cache_dir) if name.endswith('.lock'))
+        os.utime(os.path.join(self.cache_dir, lock_file), (0, 0))
+        self.assertTrue(acquire_stats_lock('stats_lock', 60))
+        self.assertFalse(acquire_stats_lock('stats_lock', 60))
+
+    def test_waiter_that_times_out_keeps_the_owners_lock(self):
+        # Worker khác đang giữ khóa và chưa ghi kết quả; vòng chờ của worker này kết thúc sớm
+        self.assertTrue(acquire_stats_lock('member_stats_monthly_lock', 60))
+        with mock.patch('sportscenters.stats.stats_lock_held', return_value=False):
+            stats = cached_stats('member_stats', ('members',), ('monthly',), lambda: {'total': 2})
+        self.assertEqual(stats, {'total': 2})
+        self.assertFalse(acquire_stats_lock('member_stats_monthly_lock', 60))
+
+    def test_waiter_reads_result_written_after_lock_release(self):
+        def owner_finishes(lock_key, timeout):
+            # Worker giữ khóa ghi kết quả và nhả khóa ngay trước lần kiểm tra cuối
+            release_stats_lock(lock_key)
+            cached_stats('member_stats', ('members',), ('monthly',), lambda: {'total': 1})
+            return False
+
+        self.assertTrue(acquire_stats_lock('member_stats_monthly_lock', 60))
+        with mock.patch('sportscenters.stats.stats_lock_held', side_effect=owner_finishes):
+            stats = cached_stats('member_stats', ('members',), ('monthly',), lambda: {'total': 99})
+        self.assertEqual(stats, {'total': 1})
+
+    def test_concurrent_misses_compute_once(self):
+        workers = 8
+        barrier = threading.Barrier(workers)
+        calls = []
+        results = []
+
+        def compute():
+            calls.append(1)
+            clock.sleep(0.3)
+            return {'total': 1}
+
+        def read():
+            barrier.wait(timeout=10)
+            results.append(cached_stats('member_stats', ('members',), ('monthly',), compute))
+
+        # Nới rộng khoảng giữa bước kiểm tra và bước ghi của FileBasedCache.add
+        original_has_key = FileBasedCache.has_key
+
+        def slow_has_key(cache, *args, **kwargs):
+            result = original_has_key(cache, *args, **kwargs)
+            clock.sleep(0.05)
+            return result
+
+        with mock.patch.object(FileBasedCache, 'has_key', slow_has_key):
+            threads = [threading.Thread(target=read) for _ in range(workers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'total': 1}] * workers)
+        self.assertFalse(any(name.endswith('.lock') for name in os.listdir(stats_cache()._dir)))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class QueryCountTests(FixturesMixin, TestCase):
+    """
+    Số truy vấn của mỗi trang danh sách là hằng số, không phụ thuộc số dòng trên trang
+    (is_enrolled, trainer_info, vai trò, token đều không truy vấn theo từng dòng).
+    """
+
+    def setUp(self):
+        self.member = self.create_member()
+
+    def clear_caches(self):
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+
+    def add_rows(self, count):
+        trainer = None
+        for _ in range(count):
+            # Mỗi lớp một huấn luyện viên riêng để lộ ra truy vấn theo từng trainer (nếu có)
+            trainer = self.create_trainer(f'trainer{Class.objects.count()}')
+            gym_class = self.create_class(trainer)
+            Enrollment.objects.create(member=self.member, gym_class=gym_class)
+            Notification.objects.create(member=self.member, message='Lịch mới', type='class_schedule')
+        return trainer
+
+    def assert_list_queries(self, user, url, expected):
+        for count in (2, 8):
+            self.add_rows(count)
+            self.clear_caches()
+            with self.assertNumQueries(expected):
+                response = self.client_for(user).get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_class_list(self):
+        # version lớp, version đăng ký + tombstone của hội viên, id lớp đã đăng ký, COUNT, trang
+        self.assert_list_queries(self.member, '/classes/', 6)
+
+    def test_enrollment_list(self):
+        # id lớp đã đăng ký (class_detail.is_enrolled), COUNT, trang
+        self.assert_list_queries(self.member, '/enrollments/', 3)
+
+    def test_notification_list(self):
+        self.assert_list_queries(self.member, '/notifications/', 2)
+
+    def test_trainer_class_list_does_not_join_user_tables(self):
+        for count in (2, 8):
+            trainer = self.add_rows(count)
+            Class.objects.update(trainer=trainer)
+            with self.assertNumQueries(1):
+                response = self.client_for(trainer).get('/trainer/enrollments/')
+            self.assertEqual(len(response.data), Class.objects.count())
+
+    def test_export_reads_in_chunks(self):
+        self.add_rows(10)
+        # Một lô dữ liệu + một lô rỗng để kết thúc, không truy vấn member/gym_class theo từng dòng
+        with self.assertNumQueries(2):
+            lines = list(ENROLLMENT_EXPORT.iter_lines(Enrollment.objects.all()))
+        self.assertEqual(len(lines), 11)
+
+    def test_role_user_is_cached_across_requests(self):
+        self.clear_caches()
+        user = User.objects.get(pk=self.member.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(resolve_role_user(user), self.member)
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_role_user(user), self.member)
+
+    def test_access_token_is_cached(self):
+        application = Application.objects.create(name='app', client_type='confidential',
+                                                 authorization_grant_type='password', user=self.member)
+        AccessToken.objects.create(user=self.member, token='token-1', application=application,
+                                   expires=timezone.now() + timedelta(hours=1), scope='read write')
+        self.clear_caches()
+        client = APIClient()
+        # token (kèm user), đối tượng hội viên theo vai trò
+        with self.assertNumQueries(2):
+            response = client.get('/users/current-user/', HTTP_AUTHORIZATION='Bearer token-1')
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(0):
+            response = client.get('/users/current-user/', HTTP_AUTHORIZATION='Bearer token-1')
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(CACHES=TEST_CACHES, BACKGROUND_WORKERS=0)
+class AdminBackgroundExportTests(FixturesMixin, TestCase):
+    """
+    "Chọn tất cả" trong changelist: job lưu bộ lọc/từ khóa thay vì danh sách khóa chính.
+    """
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        trainer = self.create_trainer()
+        yoga, boxing = self.create_class(trainer, name='Yoga'), self.create_class(trainer, name='Boxing')
+        for i in range(3):
+            member = self.create_member(f'member{i}')
+            Enrollment.objects.create(member=member, gym_class=yoga, status='approved' if i else 'pending')
+            Enrollment.objects.create(member=member, gym_class=boxing)
+        admin = User.objects.create_superuser(username='admin', password='secret', email='admin@example.com')
+        self.client.force_login(admin)
+
+    def post_action(self, query, selected, select_across):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/admin/sportscenters/enrollment/?{query}', {
+                'action': 'export_enrollments_in_background',
+                '_selected_action': [str(pk) for pk in selected],
+                'select_across': '1' if select_across else '0',
+                'index': 0,
+            })
+        self.assertEqual(response.status_code, 302)
+        return ExportJob.objects.latest('id')
+
+    def test_select_across_stores_changelist_filters(self):
+        expected = Enrollment.objects.filter(status='approved', gym_class__name__icontains='yoga')
+        job = self.post_action('status__exact=approved&q=yoga', [expected.first().pk], select_across=True)
+        self.assertNotIn('pks', job.params)
+        self.assertEqual(job.params['filters'], {'status__exact': ['approved']})
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.row_count, expected.count())
+
+    def test_manual_selection_stores_selected_rows(self):
+        selected = list(Enrollment.objects.values_list('pk', flat=True)[:2])
+        job = self.post_action('', selected, select_across=False)
+        self.assertEqual(sorted(job.params['pks']), sorted(selected))
+        self.assertEqual(job.row_count, 2)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TrainerSummarySyncTests(FixturesMixin, TestCase):
+    def setUp(self):
+        self.trainer = self.create_trainer()
+        self.gym_class = self.create_class(self.trainer)
+        self.stamp = timezone.now() - timedelta(days=1)
+        Class.objects.filter(pk=self.gym_class.pk).update(updated_date=self.stamp)
+
+    def class_queries(self, func):
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        return [query['sql'] for query in queries.captured_queries if Class._meta.db_table in query['sql']]
+
+    def test_unrelated_update_fields_skip_sync(self):
+        self.trainer.last_login = timezone.now()
+        self.assertEqual(self.class_queries(lambda: self.trainer.save(update_fields=['last_login'])), [])
+
+    def test_unchanged_summary_does_not_touch_classes(self):
+        self.trainer.experience_years += 1
+        self.trainer.save()
+        User.objects.get(pk=self.trainer.pk).save()
+        self.gym_class.refresh_from_db()
+        self.assertEqual(self.gym_class.updated_date, self.stamp)
+
+    def test_renamed_trainer_updates_classes(self):
+        self.trainer.last_name = 'Mới'
+        self.trainer.specialization = 'dance'
+        self.trainer.save()
+        self.gym_class.refresh_from_db()
+        self.assertEqual(self.gym_class.trainer_name, 'Huấn Mới')
+        self.assertEqual(self.gym_class.trainer_specialization, 'dance')
+        self.assertGreater(self.gym_class.updated_date, self.stamp)
+
+        user = User.objects.get(pk=self.trainer.pk)
+        user.first_name = 'Thầy'
+        user.save(update_fields=['first_name'])
+        self.gym_class.refresh_from_db()
+        self.assertEqual(self.gym_class.trainer_name, 'Thầy Mới')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SparseFieldsQueryTests(FixturesMixin, TestCase):
+    """
+    ?fields= chỉ được thu hẹp SELECT theo các trường serializer thực sự trả về;
+    cột bị hoãn mà serializer vẫn đọc sẽ gây một truy vấn cho mỗi dòng.
+    """
+
+    def setUp(self):
+        for i in range(7):
+            self.create_member(f'member{i}')
+        self.client = self.client_for(self.create_receptionist())
+
+    def get_members(self, query, queries):
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+        with self.assertNumQueries(queries):
+            response = self.client.get('/members/', query)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_requested_fields_only(self):
+        rows = self.get_members({'fields': 'id,full_name'}, 2)
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(set(rows[0]), {'id', 'full_name'})
+
+    def test_unknown_fields_fall_back_to_all_columns(self):
+        # password không thuộc MemberSerializer: trả đủ trường, không dùng only()
+        full = self.get_members({}, 2)
+        self.assertEqual(self.get_members({'fields': 'password'}, 2), full)
+
+    def test_mixed_known_and_unknown_fields(self):
+        rows = self.get_members({'fields': 'full_name,password,join_date'}, 2)
+        self.assertEqual(set(rows[0]), {'full_name', 'join_date'})
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CursorPaginationTests(FixturesMixin, TestCase):
+    """
+    Đi hết các trang keyset: mỗi dòng xuất hiện đúng một lần, kể cả khi trùng created_at
+    hoặc có dòng mới được chèn giữa hai lần lấy trang.
+    """
+
+    def collect_pages(self, client, url, on_page=None, link='next'):
+        pages = []
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200, response.data)
+            self.assertNotIn('count', response.data)
+            pages.append([row['id'] for row in response.data['results']])
+            if on_page:
+                on_page(len(pages))
+            previous_url, url = url, response.data[link]
+        return pages, previous_url
+
+    def test_notification_pages_with_tied_timestamps_and_inserts(self):
+        member = self.create_member()
+        Notification.objects.bulk_create([
+            Notification(member=member, message=str(i), type='promotion') for i in range(23)
+        ])
+        Notification.objects.update(created_at=timezone.now() - timedelta(hours=1))
+        expected = list(Notification.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+
+        def insert(page):
+            Notification.objects.create(member=member, message=f'new {page}', type='promotion')
+
+        client = self.client_for(member)
+        pages, last_url = self.collect_pages(client, '/notifications/?pagination=cursor', insert)
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(sum(pages, []), expected)
+
+        # Đi ngược bằng link previous: cùng các trang, không lặp và không sót
+        backward, _ = self.collect_pages(client, last_url, link='previous')
+        self.assertEqual(sum(reversed(backward), []),
+                         list(Notification.objects.order_by('-created_at', '-id').values_list('pk', flat=True)))
+
+    def test_enrollment_pages_for_receptionist(self):
+        trainer = self.create_trainer()
+        gym_class = self.create_class(trainer, max_members=50)
+        for i in range(12):
+            Enrollment.objects.create(member=self.create_member(f'member{i}'), gym_class=gym_class)
+        expected = list(Enrollment.objects.order_by('-id').values_list('pk', flat=True))
+
+        pages, _ = self.collect_pages(self.client_for(self.create_receptionist()), '/enrollments/?pagination=cursor')
+        self.assertEqual([len(page) for page in pages], [10, 2])
+        self.assertEqual(sum(pages, []), expected)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ApproximateCountPaginationTests(FixturesMixin, TestCase):
+    def setUp(self):
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+        self.members = [self.create_member(f'member{i}') for i in range(12)]
+        self.client = self.client_for(self.create_receptionist())
+
+    def test_count_false_omits_count(self):
+        member = self.members[0]
+        for i in range(12):
+            Notification.objects.create(member=member, message=str(i), type='promotion')
+            Payment.objects.create(member=member, amount=Decimal('100000'), payment_method='momo',
+                                   status='success', transaction_id=f'tx-{i}')
+        for url in ('/members/', '/payments/', '/notifications/'):
+            response = self.client.get(url, {'count': 'false'})
+            self.assertEqual(response.status_code, 200, response.data)
+            self.assertNotIn('count', response.data)
+            self.assertEqual(len(response.data['results']), 10)
+            self.assertIsNotNone(response.data['next'])
+
+            response = self.client.get(url, {'count': 'false', 'page': 2})
+            self.assertEqual(len(response.data['results']), 2)
+            self.assertIsNone(response.data['next'])
+            self.assertIsNotNone(response.data['previous'])
+
+            self.assertEqual(self.client.get(url).data['count'], 12)
+
+    def test_estimate_only_for_default_scope(self):
+        with mock.patch('sportscenters.paginators.estimated_table_rows', return_value=250000) as estimate:
+            # /members/ luôn lọc active=True: vẫn dùng số ước lượng khi client không lọc thêm
+            self.assertEqual(self.client.get('/members/').data['count'], 250000)
+            self.assertEqual(self.client.get('/members/', {'page': 2, 'fields': 'id'}).data['count'], 250000)
+            self.assertEqual(self.client.get('/members/', {'search': 'member1'}).data['count'], 3)
+            self.assertEqual(estimate.call_count, 2)
+
+        with mock.patch('sportscenters.paginators.estimated_table_rows', return_value=500):
+            # Dưới ngưỡng thì đếm thật
+            self.assertEqual(self.client.get('/members/').data['count'], 12)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class FastListParityTests(FixturesMixin, TestCase):
+    """
+    Đường serialize nhanh phải trả đúng những gì serializer DRF trả cho mỗi API danh sách dùng nó.
+    """
+
+    def setUp(self):
+        self.trainer = self.create_trainer()
+        Trainer.objects.filter(pk=self.trainer.pk).update(full_name='Huấn Luyện', specialization='Yoga')
+        self.trainer.refresh_from_db()
+        self.member = self.create_member()
+        self.receptionist = self.create_receptionist()
+        enrolled = self.create_class(self.trainer, name='Enrolled', current_capacity=1)
+        self.create_class(self.trainer, name='Other')
+        Enrollment.objects.create(member=self.member, gym_class=enrolled)
+        Enrollment.objects.create(member=self.create_member('other'), gym_class=enrolled, status='pending')
+        Payment.objects.create(member=self.member, amount=Decimal('150000.50'), payment_method='momo',
+                               status='success', transaction_id='tx-1')
+        Notification.objects.create(member=self.member, message='Lịch học', type='class_schedule')
+        Notification.objects.create(member=self.member, message='Đã đọc', type='reminder', is_read=True)
+
+    def assert_same_as_serializer(self, view_class, user, url, query=None):
+        client = self.client_for(user)
+        with mock.patch.object(CompiledSerializer, 'to_representation', autospec=True,
+                               side_effect=CompiledSerializer.to_representation) as fast:
+            fast_response = client.get(url, query)
+        self.assertTrue(fast.called, f'{url} không dùng đường serialize nhanh')
+        with mock.patch.object(view_class, 'fast_list', False):
+            slow_response = client.get(url, query)
+
+        self.assertEqual(fast_response.status_code, 200)
+        self.assertEqual(slow_response.status_code, 200)
+        fast_data, slow_data = json.loads(fast_response.content), json.loads(slow_response.content)
+        self.assertTrue(fast_data['results'] if isinstance(fast_data, dict) else fast_data)
+        self.assertEqual(fast_data, slow_data)
+
+    def test_classes(self):
+        self.assert_same_as_serializer(ClassViewSet, self.member, '/classes/')
+        self.assert_same_as_serializer(TrainerClassListView, self.trainer, '/trainer/enrollments/')
+
+    def test_enrollments(self):
+        self.assert_same_as_serializer(EnrollmentViewSet, self.receptionist, '/enrollments/')
+        self.assert_same_as_serializer(EnrollmentViewSet, self.member, '/enrollments/', {'pagination': 'cursor'})
+
+    def test_payments(self):
+        self.assert_same_as_serializer(PaymentViewSet, self.receptionist, '/payments/')
+
+    def test_notifications(self):
+        self.assert_same_as_serializer(NotificationViewSet, self.member, '/notifications/')
+        self.assert_same_as_serializer(NotificationViewSet, self.member, '/notifications/', {'fields': 'id,message,is_read'})
@@ -17,6 +17,7 @@ router.register('payments', views.PaymentViewSet, basename='payment')
 router.register('notifications', views.NotificationViewSet, basename='notification')
 router.register('internalnews', views.InternalNewsViewSet, basename='internalnews')
 router.register(r'stats', views.StatisticViewSet, basename='stats')
+router.register('export-jobs', views.ExportJobViewSet, basename='export-job')
 urlpatterns = [
     path('', include(router.urls)),
     path('users/current-user/', views.UserViewSet.get_current_user, name='current_user'),
@@ -1,32 +1,194 @@
-from rest_framework import viewsets, generics, status, parsers, permissions, filters
+from rest_framework import viewsets, generics, mixins, status, parsers, permissions, filters
 from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
 from django.utils.timezone import now
 from sportscenters import paginators, perms, serializers
+from sportscenters.authentication import get_role_user, token_cache_metrics
+from sportscenters.conditional import (
+    ConditionalGetMixin, collection_version, collection_etag, not_modified, set_validators
+)
+from sportscenters.fast_serializers import FastListMixin
+from sportscenters.notifications import enqueue_fan_out, get_unread_count, adjust_unread_count
+from sportscenters.stats import (
+    normalize_period, iter_periods, period_floor, trunc_period, to_date, day_start, day_end,
+    compute_member_stats, compute_revenue_stats, snapshot_series, snapshot_class_enrollments,
+    cached_stats, cache_metrics, bump_stats_version
+)
 from datetime import datetime, timedelta
 from django.db.models import Sum, Count
 from django.utils import timezone
-from django.core.cache import cache
+from django.db import IntegrityError, transaction
 from .models import (
     Class, Trainer, User, Progress, Member, Enrollment, Payment,
-    InternalNews, Appointment, Notification, Receptionist, Statistic
+    InternalNews, Appointment, Notification, Receptionist, Statistic, ExportJob, Tombstone
 )
 from .serializers import (
     ClassSerializer, TrainerSerializer, UserSerializer, NotificationSerializer, ReceptionistSerializer,
     MemberSerializer, PaymentSerializer, ProgressSerializer, EnrollmentSerializer,
-    AppointmentSerializer, InternalNewsSerializer, StatisticSerializer, UserProfileSerializer
+    AppointmentSerializer, InternalNewsSerializer, StatisticSerializer, UserProfileSerializer,
+    ExportJobSerializer, EnrollmentBulkSerializer, NotificationFanOutSerializer
 )
 from rest_framework.views import APIView
+from django.conf import settings
+from django.http import FileResponse
+import os
+from django.core.exceptions import FieldDoesNotExist
 from rest_framework.response import Response
 from rest_framework import status
 from django.db.models import Q
-from django.utils.dateparse import parse_date
+from django.utils.dateparse import parse_date, parse_datetime
 from django.db.models import Case, When, F, FloatField, Value
-from django.db.models import ExpressionWrapper
+from django.db.models import ExpressionWrapper, OuterRef, Subquery, IntegerField, DecimalField
+from django.db.models.functions import Coalesce
+
+class SparseFieldsMixin:
+    """
+    Hỗ trợ ?fields=id,full_name,avatar cho các request GET: serializer chỉ trả về
+    các trường được yêu cầu, và nếu mọi trường được giữ lại đều đọc thẳng từ cột của model
+    thì queryset cũng chỉ SELECT khóa chính và các cột đó (only()).
+    """
+    fields_query_param = 'fields'
+
+    def get_requested_fields(self):
+        request = getattr(self, 'request', None)
+        if request is None or request.method != 'GET':
+            return None
+        value = request.query_params.get(self.fields_query_param)
+        if not value:
+            return None
+        return [name.strip() for name in value.split(',') if name.strip()]
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_requested_fields()
+        if fields and issubclass(self.get_serializer_class(), serializers.DynamicFieldsMixin):
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fields = self.get_requested_fields()
+        if fields and not queryset.query.select_related:
+            columns = self.get_only_columns(queryset.model, fields)
+            if columns:
+                queryset = queryset.only(*columns)
+        return queryset
+
+    def get_only_columns(self, model, fields):
+        """
+        Cột cho only(), hoặc None khi không thu hẹp được: serializer không lọc trường
+        (không dùng DynamicFieldsMixin hoặc không tên nào khớp nên trả đủ trường), hoặc có
+        trường được giữ lại không đọc thẳng từ một cột (quan hệ lồng, SerializerMethodField...).
+        Trả về cột thừa thì mỗi dòng phải nạp lại cột bị hoãn, nên chỉ dùng các trường thực sự xuất ra.
+        """
+        if not issubclass(self.get_serializer_class(), serializers.DynamicFieldsMixin):
+            return None
+        kept = self.get_serializer(fields=fields).fields
+        if not set(fields) & set(kept):
+            return None
+
+        columns = [model._meta.pk.name]
+        for serializer_field in kept.values():
+            try:
+                field = model._meta.get_field(serializer_field.source)
+            except FieldDoesNotExist:
+                return None
+            if not field.concrete or field.many_to_many:
+                return None
+            # Khóa ngoại: only() theo tên trường nạp cột <tên>_id
+            columns.append(field.name)
+        return columns
+
+
+class EnrolledClassesContextMixin:
+    """
+    Nạp một lần các lớp mà hội viên hiện tại đã đăng ký (approved) vào context,
+    để ClassSerializer.is_enrolled không phải truy vấn cho từng lớp.
+    """
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        user = getattr(self.request, 'user', None)
+        if user and user.is_authenticated and user.role == 'member':
+            if not hasattr(self, '_enrolled_class_ids'):
+                self._enrolled_class_ids = set(
+                    Enrollment.objects.filter(
+                        member_id=user.pk,
+                        status='approved'
+                    ).values_list('gym_class_id', flat=True)
+                )
+            context['enrolled_class_ids'] = self._enrolled_class_ids
+        return context
 
-class ClassViewSet(viewsets.ModelViewSet):
+
+def parse_moment(value, end_of_day=False):
+    """
+    Đọc mốc thời gian dạng ISO 8601 hoặc YYYY-MM-DD (đầu/cuối ngày). Sai định dạng thì ValueError.
+    """
+    # Thử dạng ngày trước: từ Python 3.11 parse_datetime cũng nhận YYYY-MM-DD (00:00), làm mất end_of_day
+    day = parse_date(value)
+    if day is not None:
+        return day_end(day) if end_of_day else day_start(day)
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError(value)
+    return moment if timezone.is_aware(moment) else timezone.make_aware(moment)
+
+
+class DeltaSyncMixin:
+    """
+    Chế độ đồng bộ ?since=<thời điểm> cho action list: chỉ trả về các dòng được tạo/sửa từ
+    thời điểm đó, cùng danh sách id đã bị xóa (xóa mềm theo `sync_deleted_q`, xóa hẳn theo
+    Tombstone). Client lưu lại `until` và gửi nó làm `since` ở lần đồng bộ sau.
+    """
+    sync_updated_field = 'updated_date'
+    sync_deleted_q = Q(active=False)
+    tombstone_kind = None
+
+    def list(self, request, *args, **kwargs):
+        since = request.query_params.get('since')
+        if since is None:
+            return super().list(request, *args, **kwargs)
+        try:
+            since = parse_moment(since)
+        except ValueError:
+            return Response({"error": "since phải là ISO 8601 hoặc YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+        if since < timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_DAYS):
+            # Tombstone cũ hơn đã bị dọn: client phải tải lại toàn bộ
+            return Response({"error": "since quá cũ, cần đồng bộ lại toàn bộ."}, status=status.HTTP_410_GONE)
+
+        # Lấy mốc trước khi truy vấn; dùng >= nên dòng ở đúng mốc có thể được gửi lại (client ghi đè)
+        until = timezone.now()
+        changed = self.filter_queryset(self.get_queryset()).filter(**{f'{self.sync_updated_field}__gte': since})
+        deleted = set()
+        if self.sync_deleted_q is not None:
+            deleted.update(changed.filter(self.sync_deleted_q).values_list('pk', flat=True))
+            changed = changed.exclude(self.sync_deleted_q)
+        if self.tombstone_kind:
+            tombstones = Tombstone.objects.filter(kind=self.tombstone_kind, deleted_at__gte=since)
+            if request.user.role == 'member':
+                # Dòng không có chủ (lớp học) thì ai cũng cần biết
+                tombstones = tombstones.filter(Q(owner_id=request.user.pk) | Q(owner_id__isnull=True))
+            elif request.user.role == 'trainer':
+                # Huấn luyện viên chỉ thấy enrollment của các lớp mình dạy
+                own_classes = Class.objects.filter(trainer_id=request.user.pk).values('pk')
+                tombstones = tombstones.filter(Q(class_id__in=own_classes) | Q(owner_id__isnull=True))
+            deleted.update(tombstones.values_list('object_id', flat=True))
+
+        serializer = self.get_serializer(changed, many=True)
+        return Response({
+            'since': since,
+            'until': until,
+            'results': serializer.data,
+            'deleted': sorted(deleted)
+        })
+
+
+class ClassViewSet(ConditionalGetMixin, DeltaSyncMixin, FastListMixin, SparseFieldsMixin, EnrolledClassesContextMixin,
+                   viewsets.ModelViewSet):
     serializer_class = ClassSerializer
+    sync_deleted_q = Q(active=False) | Q(deleted_at__isnull=False)
+    tombstone_kind = 'class'
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = paginators.StandardResultsSetPagination
 
@@ -42,6 +204,56 @@ class ClassViewSet(viewsets.ModelViewSet):
         context['request'] = self.request
         return context
 
+    def get_extra_versions(self):
+        # is_enrolled phụ thuộc các đăng ký của hội viên gọi API (kể cả đăng ký đã bị xóa)
+        user = self.request.user
+        if user.role != 'member':
+            return []
+        return [
+            collection_version(Enrollment.objects.filter(member_id=user.pk)),
+            collection_version(Tombstone.objects.filter(kind='enrollment', owner_id=user.pk), ('deleted_at',)),
+        ]
+
+    CALENDAR_FIELDS = (
+        'id', 'name', 'start_time', 'end_time', 'status', 'trainer_id', 'trainer_name',
+        'trainer_specialization', 'current_capacity', 'max_members', 'price'
+    )
+    CALENDAR_MAX_DAYS = 92
+
+    @action(detail=False, methods=['get'])
+    def calendar(self, request):
+        """
+        Thời khóa biểu: các lớp chưa bị xóa có thời gian giao với [from, to], sắp theo giờ bắt đầu.
+        Mặc định là tuần hiện tại. Trả 304 khi ETag/Last-Modified của client vẫn đúng.
+        """
+        params = request.query_params
+        try:
+            start = parse_moment(params['from']) if params.get('from') else day_start(period_floor(timezone.now(), 'weekly'))
+            end = parse_moment(params['to'], end_of_day=True) if params.get('to') else start + timedelta(days=7)
+            trainer_id = int(params['trainer']) if params.get('trainer') else None
+        except ValueError:
+            return Response({"error": "Tham số không hợp lệ: from/to là YYYY-MM-DD hoặc ISO 8601, trainer là id."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not timedelta(0) < end - start <= timedelta(days=self.CALENDAR_MAX_DAYS):
+            return Response({"error": f"Khoảng thời gian phải dương và không quá {self.CALENDAR_MAX_DAYS} ngày."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # Điều kiện giao nhau trên (start_time, end_time), khớp index class_active_time_idx
+        queryset = Class.objects.filter(active=True, deleted_at__isnull=True, start_time__lt=end, end_time__gt=start)
+        if trainer_id is not None:
+            queryset = queryset.filter(trainer_id=trainer_id)
+        if params.get('specialization'):
+            queryset = queryset.filter(trainer_specialization=params['specialization'])
+
+        count, last_modified = collection_version(queryset)
+        etag = collection_etag(count, last_modified)
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        classes = list(queryset.order_by('start_time', 'id').values(*self.CALENDAR_FIELDS))
+        return set_validators(Response({'from': start, 'to': end, 'results': classes}), etag, last_modified)
+
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         if instance.deleted_at:
@@ -70,7 +282,7 @@ class ClassViewSet(viewsets.ModelViewSet):
         return Response({"message": f"Lớp học '{instance.name}' đã được khôi phục."}, status=200)
 
 
-class TrainerViewSet(viewsets.ModelViewSet):
+class TrainerViewSet(ConditionalGetMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Trainer.objects.all()
     serializer_class = TrainerSerializer
     pagination_class = paginators.StandardResultsSetPagination
@@ -92,12 +304,12 @@ class UserViewSet(viewsets.ViewSet, generics.CreateAPIView, generics.UpdateAPIVi
         return Response(serializers.UserSerializer(request.user).data)
 
 
-class MemberViewSet(viewsets.ModelViewSet):
+class MemberViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Member.objects.all()
     serializer_class = MemberSerializer
     filter_backends = [filters.SearchFilter]
     search_fields = ['first_name', 'last_name', 'email','full_name', 'phone']
-    pagination_class = paginators.StandardResultsSetPagination
+    pagination_class = paginators.ApproximateCountPagination
 
     def get_queryset(self):
         queryset = Member.objects.filter(active=True)
@@ -113,26 +325,29 @@ class MemberViewSet(viewsets.ModelViewSet):
         return queryset
 
 
-class ReceptionistViewSet(viewsets.ModelViewSet):
+class ReceptionistViewSet(ConditionalGetMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Receptionist.objects.all()
     serializer_class = ReceptionistSerializer
     pagination_class = paginators.StandardResultsSetPagination
 
 
-class EnrollmentViewSet(viewsets.ModelViewSet):
+class EnrollmentViewSet(DeltaSyncMixin, FastListMixin, SparseFieldsMixin, EnrolledClassesContextMixin, viewsets.ModelViewSet):
     queryset = Enrollment.objects.all()
+    tombstone_kind = 'enrollment'
     serializer_class = EnrollmentSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = paginators.CursorOptionalPagination
 
     def get_queryset(self):
         user = self.request.user
 
+        # Member/Trainer dùng chung khóa chính với User nên lọc thẳng theo user.pk, không cần join
         if user.role == 'member':
-            queryset = Enrollment.objects.filter(member=user.member)
+            queryset = Enrollment.objects.filter(member_id=user.pk)
         elif user.role == 'receptionist':
             queryset = Enrollment.objects.all()
         elif user.role == 'trainer':
-            queryset = Enrollment.objects.filter(gym_class__trainer=user.trainer)
+            queryset = Enrollment.objects.filter(gym_class__trainer_id=user.pk)
         else:
             return Enrollment.objects.none()
 
@@ -152,7 +367,7 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
         member = serializer.validated_data.get('member')
 
         if user.role == 'member':
-            member = user.member
+            member = get_role_user(self.request)
         elif user.role == 'receptionist':
             if not member:
                 raise ValidationError("Receptionist phải chọn học viên.")
@@ -163,51 +378,137 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
         if Enrollment.objects.filter(member=member, gym_class=gym_class).exists():
             raise ValidationError("Học viên đã đăng ký lớp học này rồi.")
 
-        if gym_class.current_capacity >= gym_class.max_members:
-            raise ValidationError("Lớp học đã đủ số lượng học viên.")
+        with transaction.atomic():
+            # Kiểm tra và tăng sĩ số trong một câu UPDATE có điều kiện để không bán vượt chỗ
+            reserved = Class.objects.filter(
+                pk=gym_class.pk,
+                current_capacity__lt=F('max_members')
+            ).update(current_capacity=F('current_capacity') + 1, updated_date=timezone.now())
+            if not reserved:
+                raise ValidationError("Lớp học đã đủ số lượng học viên.")
+
+            try:
+                serializer.save(member=member)
+            except IntegrityError:
+                raise ValidationError("Học viên đã đăng ký lớp học này rồi.")
 
+    def perform_update(self, serializer):
+        # Serializer không kiểm tra trùng (member, gym_class): ràng buộc CSDL chặn khi sửa sang một cặp đã có
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            raise ValidationError("Học viên đã đăng ký lớp học này rồi.")
 
-        serializer.save(member=member)
-        gym_class.current_capacity += 1
-        gym_class.save()
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """
+        Lễ tân đăng ký một nhóm học viên vào một lớp. Mỗi học viên có một kết quả riêng:
+        created, duplicate, not_member hoặc class_full.
+        """
+        if request.user.role != 'receptionist':
+            raise PermissionDenied("Chỉ lễ tân được đăng ký theo nhóm.")
+
+        serializer = EnrollmentBulkSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        member_ids = serializer.validated_data['members']
+        enrollment_status = serializer.validated_data['status']
+        class_id = serializer.validated_data['gym_class'].pk
+
+        member_set = set(Member.objects.filter(pk__in=member_ids).values_list('pk', flat=True))
+        results = {member_id: 'not_member' for member_id in member_ids if member_id not in member_set}
+
+        with transaction.atomic():
+            # Khóa dòng lớp học: đăng ký lẻ (UPDATE sĩ số) phải chờ lô này xong,
+            # nên kiểm tra trùng và số chỗ còn lại bên dưới không bị lệch
+            gym_class = Class.objects.select_for_update().only('current_capacity', 'max_members').get(pk=class_id)
+            existing = set(Enrollment.objects.filter(
+                gym_class_id=class_id, member_id__in=member_set
+            ).values_list('member_id', flat=True))
+
+            candidates = []
+            for member_id in member_ids:
+                if member_id in results:
+                    continue
+                if member_id in existing:
+                    results[member_id] = 'duplicate'
+                else:
+                    candidates.append(member_id)
+
+            available = max(0, gym_class.max_members - gym_class.current_capacity)
+            accepted = candidates[:available]
+            for member_id in candidates[available:]:
+                results[member_id] = 'class_full'
+
+            if accepted:
+                Class.objects.filter(pk=class_id).update(
+                    current_capacity=F('current_capacity') + len(accepted), updated_date=timezone.now()
+                )
+                Enrollment.objects.bulk_create([
+                    Enrollment(member_id=member_id, gym_class_id=class_id, status=enrollment_status)
+                    for member_id in accepted
+                ])
+                # bulk_create không gửi post_save nên tự báo cho cache thống kê
+                transaction.on_commit(lambda: bump_stats_version('enrollments'))
+
+        # MySQL không trả khóa chính sau bulk_create: đọc lại id theo (lớp, học viên)
+        enrollment_ids = dict(Enrollment.objects.filter(
+            gym_class_id=class_id, member_id__in=accepted
+        ).values_list('member_id', 'pk')) if accepted else {}
+
+        messages = {
+            'duplicate': "Học viên đã đăng ký lớp học này rồi.",
+            'not_member': "Người dùng này không phải là hội viên.",
+            'class_full': "Lớp học đã đủ số lượng học viên.",
+        }
+        items = []
+        for member_id in member_ids:
+            if member_id in enrollment_ids:
+                items.append({'member': member_id, 'status': 'created', 'enrollment': enrollment_ids[member_id]})
+            else:
+                outcome = results[member_id]
+                items.append({'member': member_id, 'status': outcome, 'error': messages[outcome]})
 
+        return Response({
+            'gym_class': class_id,
+            'created': len(accepted),
+            'results': items
+        }, status=status.HTTP_201_CREATED if accepted else status.HTTP_400_BAD_REQUEST)
 
     def perform_destroy(self, instance):
-        gym_class = instance.gym_class
-        gym_class.current_capacity = max(0, gym_class.current_capacity - 1)
-        gym_class.save()
-        instance.delete()
+        with transaction.atomic():
+            Class.objects.filter(
+                pk=instance.gym_class_id,
+                current_capacity__gt=0
+            ).update(current_capacity=F('current_capacity') - 1, updated_date=timezone.now())
+            instance.delete()
 
 
-class ProgressViewSet(viewsets.ModelViewSet):
+class ProgressViewSet(ConditionalGetMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Progress.objects.all()
     serializer_class = ProgressSerializer
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = paginators.StandardResultsSetPagination
 
 
-class TrainerClassListView(generics.ListAPIView):
+class TrainerClassListView(FastListMixin, SparseFieldsMixin, EnrolledClassesContextMixin, generics.ListAPIView):
     serializer_class = ClassSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         user = self.request.user
         if user.role == 'trainer':
-            try:
-                trainer = Trainer.objects.get(pk=user.pk)
-                return Class.objects.filter(trainer=trainer)
-            except Trainer.DoesNotExist:
-                return Class.objects.none()
+            return Class.objects.filter(trainer_id=user.pk)
         return Class.objects.none()
 
 
-class AppointmentViewSet(viewsets.ModelViewSet):
+class AppointmentViewSet(ConditionalGetMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Appointment.objects.all()
     serializer_class = AppointmentSerializer
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = paginators.StandardResultsSetPagination
 
-class TrainerStudentListView(generics.ListAPIView):
+class TrainerStudentListView(SparseFieldsMixin, generics.ListAPIView):
     serializer_class = MemberSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -217,43 +518,140 @@ class TrainerStudentListView(generics.ListAPIView):
         if user.role != 'trainer':
             return Member.objects.none()
 
-        try:
-            trainer = Trainer.objects.get(pk=user.pk)
-        except Trainer.DoesNotExist:
-            return Member.objects.none()
-
-
-        enrollments = Enrollment.objects.filter(
-            gym_class__trainer=trainer,
+        member_ids = Enrollment.objects.filter(
+            gym_class__trainer_id=user.pk,
             status='approved'
-        ).select_related('member')
-
-
-        member_ids = enrollments.values_list('member__id', flat=True).distinct()
+        ).values_list('member_id', flat=True).distinct()
 
         return Member.objects.filter(id__in=member_ids)
 
-class PaymentViewSet(viewsets.ModelViewSet):
+class PaymentViewSet(FastListMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
-    pagination_class = paginators.StandardResultsSetPagination
+    pagination_class = paginators.CursorOptionalPagination
 
 
-class NotificationViewSet(viewsets.ModelViewSet):
+class NotificationViewSet(DeltaSyncMixin, FastListMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Notification.objects.all()
+    sync_updated_field = 'updated_at'
+    sync_deleted_q = None
+    tombstone_kind = 'notification'
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = paginators.StandardResultsSetPagination
+    pagination_class = paginators.CursorOptionalPagination
+    cursor_ordering = ('-created_at', '-id')
+
+    def get_queryset(self):
+        user = self.request.user
+
+        if user.role == 'member':
+            queryset = Notification.objects.filter(member_id=user.pk)
+        elif user.is_staff or user.role == 'receptionist':
+            queryset = Notification.objects.all()
+            member_id = self.request.query_params.get('member')
+            if member_id:
+                queryset = queryset.filter(member_id=member_id)
+        else:
+            return Notification.objects.none()
+
+        return queryset.order_by('-created_at', '-id')
+
+    @action(detail=False, methods=['get'], url_path='unread-count')
+    def unread_count(self, request):
+        if request.user.role != 'member':
+            return Response({'unread_count': 0})
+        return Response({'unread_count': get_unread_count(request.user.pk)})
+
+    @action(detail=True, methods=['patch', 'post'], url_path='mark-read')
+    def mark_read(self, request, pk=None):
+        notification = self.get_object()
+        # UPDATE có điều kiện: thông báo đã đọc thì không ghi lại (updated_at giữ nguyên cho ?since=)
+        # và bộ đếm chỉ giảm khi thông báo thực sự chuyển từ chưa đọc sang đã đọc
+        if Notification.objects.filter(pk=notification.pk, is_read=False).update(is_read=True, updated_at=timezone.now()):
+            adjust_unread_count(notification.member_id, -1)
+        return Response({'id': notification.pk, 'is_read': True})
+
+    @action(detail=False, methods=['post'], url_path='mark-all-read')
+    def mark_all_read(self, request):
+        if request.user.role != 'member':
+            raise PermissionDenied("Chỉ hội viên mới có thông báo để đánh dấu.")
+        updated = Notification.objects.filter(member_id=request.user.pk, is_read=False).update(
+            is_read=True, updated_at=timezone.now()
+        )
+        # Trừ đúng số dòng vừa chuyển trạng thái: thông báo tạo cùng lúc vẫn giữ phần cộng của nó
+        adjust_unread_count(request.user.pk, -updated)
+        return Response({'updated': updated})
+
+    @action(detail=False, methods=['get', 'post'], url_path='fan-out')
+    def fan_out(self, request):
+        """
+        POST: gửi thông báo hàng loạt ở luồng nền, trả về batch_key. Gửi lại cùng batch_key
+        (ví dụ sau timeout) không tạo thông báo trùng.
+        GET ?batch_key=...: số thông báo đã tạo của lần gửi đó.
+        """
+        if not (request.user.is_staff or request.user.role == 'receptionist'):
+            raise PermissionDenied("Bạn không có quyền gửi thông báo hàng loạt.")
+
+        if request.method == 'GET':
+            batch_key = request.query_params.get('batch_key')
+            if not batch_key:
+                return Response({"error": "Thiếu batch_key."}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({
+                'batch_key': batch_key,
+                'created': Notification.objects.filter(batch_key=batch_key).count()
+            })
 
+        serializer = NotificationFanOutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        gym_class = data.get('gym_class')
+        batch_key = enqueue_fan_out(
+            data['message'], data['type'], data.get('batch_key'),
+            gym_class=gym_class.pk if gym_class else None, segment=data.get('segment')
+        )
+        return Response({'batch_key': batch_key, 'status': 'queued'}, status=status.HTTP_202_ACCEPTED)
 
-class InternalNewsViewSet(viewsets.ModelViewSet):
+
+class InternalNewsViewSet(ConditionalGetMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = InternalNews.objects.all()
+    # author_name lấy từ bảng huấn luyện viên
+    version_fields = ('updated_date', 'author__updated_date')
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = InternalNewsSerializer
     pagination_class = paginators.StandardResultsSetPagination
 
 
-class StatisticViewSet(viewsets.ModelViewSet):
+class ExportJobViewSet(SparseFieldsMixin, mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Export dữ liệu lớn ở chế độ nền: POST tạo job, GET /export-jobs/{id}/ để theo dõi trạng thái,
+    khi status = 'done' thì tải từng file qua /export-jobs/{id}/download/?part=1.
+    """
+    queryset = ExportJob.objects.all()
+    serializer_class = ExportJobSerializer
+    permission_classes = [permissions.IsAdminUser]
+    pagination_class = paginators.StandardResultsSetPagination
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != 'done':
+            return Response({"error": "Job chưa hoàn thành."}, status=status.HTTP_409_CONFLICT)
+        try:
+            part = int(request.query_params.get('part', 1))
+        except ValueError:
+            part = 0
+        if not 1 <= part <= len(job.files):
+            return Response({"error": "part không hợp lệ."}, status=status.HTTP_400_BAD_REQUEST)
+
+        path = job.files[part - 1]
+        full_path = os.path.join(settings.MEDIA_ROOT, path)
+        if not os.path.exists(full_path):
+            return Response({"error": "File export không còn tồn tại."}, status=status.HTTP_410_GONE)
+        return FileResponse(open(full_path, 'rb'), as_attachment=True,
+                            filename=os.path.basename(path), content_type='text/csv')
+
+
+class StatisticViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Statistic.objects.all()
     serializer_class = StatisticSerializer
 
@@ -300,37 +698,11 @@ class StatisticViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            stats = self.get_class_member_stats(period, start_date, end_date)
-
-            # Optional filtering
-            class_id = request.query_params.get('class_id')
-            trainer_id = request.query_params.get('trainer_id')
-
-            if class_id or trainer_id:
-                filtered_stats = []
-                for period_stat in stats:
-                    filtered_classes = period_stat['classes']
-
-                    if class_id:
-                        filtered_classes = [c for c in filtered_classes if c['class_id'] == int(class_id)]
-
-                    if trainer_id:
-                        # Filter by trainer - need to check trainer relationship
-                        target_classes = Class.objects.filter(trainer_id=trainer_id).values_list('id', flat=True)
-                        filtered_classes = [c for c in filtered_classes if c['class_id'] in target_classes]
-
-                    # Recalculate summary stats for filtered data
-                    period_stat['classes'] = filtered_classes
-                    period_stat['total_classes'] = len(filtered_classes)
-                    period_stat['total_new_enrollments'] = sum(c['new_enrollments'] for c in filtered_classes)
-                    period_stat['average_occupancy_rate'] = round(
-                        sum(c['occupancy_rate'] for c in filtered_classes) / len(filtered_classes)
-                        if filtered_classes else 0, 2
-                    )
-
-                    filtered_stats.append(period_stat)
-
-                stats = filtered_stats
+            stats = self.get_class_member_stats(
+                period, start_date, end_date,
+                class_id=request.query_params.get('class_id'),
+                trainer_id=request.query_params.get('trainer_id')
+            )
 
             return Response({
                 'success': True,
@@ -353,99 +725,73 @@ class StatisticViewSet(viewsets.ModelViewSet):
     def get_member_stats(self, period, start_date, end_date):
         """
         Lấy thống kê hội viên với cache.
+        Kỳ đã chốt đọc từ snapshot Statistic, kỳ đang mở tính trực tiếp.
         """
-        cache_key = f"member_stats_{period}_{start_date.date()}_{end_date.date()}"
-        stats = cache.get(cache_key)
-        if not stats:
-            stats = []
-            current_date = start_date
-            delta = {
-                'weekly': timedelta(days=7),
-                'monthly': timedelta(days=30),
-                'yearly': timedelta(days=365)
-            }.get(period, timedelta(days=30))
-
-            while current_date <= end_date:
-                period_end = current_date + delta
-                member_count = Member.objects.filter(
-                    active=True,
-                    join_date__lte=period_end.date()
-                ).count()
-                new_members = Member.objects.filter(
-                    join_date__range=[current_date.date(), period_end.date()]
-                ).count()
-                cancelled_members = Member.objects.filter(
-                    cancellation_date__range=[current_date.date(), period_end.date()]
-                ).count()
-
-                stats.append({
-                    'period_start': current_date.date(),
-                    'period_end': period_end.date(),
-                    'member_count': member_count,
-                    'new_members': new_members,
-                    'cancelled_members': cancelled_members
-                })
-                current_date += delta
-
-            cache.set(cache_key, stats, timeout=3600)  # Cache 1 giờ
-        return stats
+        period = normalize_period(period)
+        return cached_stats(
+            'member_stats', ('members',), (period, start_date.date(), end_date.date()),
+            lambda: snapshot_series(
+                period, start_date, end_date,
+                ('member_count', 'new_members', 'cancelled_members'),
+                compute_member_stats
+            )
+        )
 
     def get_revenue_stats(self, period, start_date, end_date):
         """
         Lấy thống kê doanh thu với cache.
+        Kỳ đã chốt đọc từ snapshot Statistic, kỳ đang mở tính trực tiếp.
         """
-        cache_key = f"revenue_stats_{period}_{start_date.date()}_{end_date.date()}"
-        stats = cache.get(cache_key)
-        if not stats:
-            stats = []
-            current_date = start_date
-            delta = {
-                'weekly': timedelta(days=7),
-                'monthly': timedelta(days=30),
-                'yearly': timedelta(days=365)
-            }.get(period, timedelta(days=30))
-
-            while current_date <= end_date:
-                period_end = current_date + delta
-                total_revenue = Payment.objects.filter(
-                    date_paid__range=[current_date, period_end],  # Sửa từ payment_date thành date_paid
-                    status='completed'
-                ).aggregate(total=Sum('amount'))['total'] or 0
-
-                stats.append({
-                    'period_start': current_date.date(),
-                    'period_end': period_end.date(),
-                    'total_revenue': total_revenue
-                })
-                current_date += delta
-
-            cache.set(cache_key, stats, timeout=3600)  # Cache 1 giờ
-        return stats
+        period = normalize_period(period)
+        return cached_stats(
+            'revenue_stats', ('payments',), (period, start_date.date(), end_date.date()),
+            lambda: snapshot_series(period, start_date, end_date, ('total_revenue',), compute_revenue_stats)
+        )
 
     def get_class_stats(self, period, start_date, end_date):
         """
         Lấy thống kê lớp học với cache.
+        Kỳ đã chốt đọc từ snapshot Statistic, kỳ đang mở tính trực tiếp.
         """
-        cache_key = f"class_stats_{period}_{start_date.date()}_{end_date.date()}"
-        stats = cache.get(cache_key)
-        if not stats:
-            stats = []
-            classes = Class.objects.all()
-            for cls in classes:
-                total_enrollments = Enrollment.objects.filter(
-                    class_id=cls,
-                    created_date__date__range=[start_date, end_date]
-                ).count()
-
-                stats.append({
-                    'class_id': cls.id,
-                    'class_name': cls.name,
-                    'total_enrollments': total_enrollments
-                })
+        period = normalize_period(period)
+        return cached_stats(
+            'class_stats', ('enrollments', 'classes'), (period, start_date.date(), end_date.date()),
+            lambda: self.compute_class_stats(period, start_date, end_date)
+        )
 
-            cache.set(cache_key, stats, timeout=3600)  # Cache 1 giờ
+    def compute_class_stats(self, period, start_date, end_date):
+        """
+        Số enrollment của mỗi lớp trong khoảng thời gian, kèm chi tiết theo từng kỳ
+        (chỉ liệt kê các kỳ có enrollment). Số liệu lấy từ một truy vấn nhóm theo
+        (lớp, kỳ) và snapshot; tên lớp lấy bằng một truy vấn values().
+        """
+        periods = list(iter_periods(start_date, end_date, period))
+        counts = snapshot_class_enrollments(period, start_date, end_date)
+
+        stats = []
+        for cls in Class.objects.values('id', 'name'):
+            buckets = counts.get(cls['id'], {})
+            stats.append({
+                'class_id': cls['id'],
+                'class_name': cls['name'],
+                'total_enrollments': sum(buckets.values()),
+                'periods': [{
+                    'period_start': period_start,
+                    'period_end': period_end,
+                    'enrollments': buckets[period_start]
+                } for period_start, period_end in periods if buckets.get(period_start)]
+            })
         return stats
 
+    @action(detail=False, methods=['get'], url_path='cache-metrics')
+    def cache_metrics(self, request):
+        """
+        Số lần hit/miss của cache thống kê và cache kiểm tra access token (dùng chung giữa các worker).
+        """
+        metrics = cache_metrics()
+        metrics['access_tokens'] = token_cache_metrics()
+        return Response(metrics)
+
     @action(detail=False, methods=['get'], url_path='members')
     def member_stats(self, request):
         period = request.query_params.get('period', 'monthly')
@@ -509,7 +855,7 @@ class StatisticViewSet(viewsets.ModelViewSet):
             )
 
             # Top 5 lớp học có nhiều hội viên nhất
-            top_classes = Class.objects.filter(active=True, deleted_at__isnull=True).annotate(
+            top_classes = Class.objects.filter(active=True, deleted_at__isnull=True).select_related('trainer').annotate(
                 member_count=Count('enrollment', filter=Q(enrollment__status='approved'))
             ).order_by('-member_count')[:5]
 
@@ -546,99 +892,114 @@ class StatisticViewSet(viewsets.ModelViewSet):
                 'error': f'An error occurred: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    def get_class_member_stats(self, period, start_date, end_date):
+    def get_class_member_stats(self, period, start_date, end_date, class_id=None, trainer_id=None):
         """
-        Lấy thống kê chi tiết số lượng hội viên của từng lớp học theo thời kỳ
+        Lấy thống kê chi tiết số lượng hội viên của từng lớp học theo thời kỳ (có cache).
         """
-        cache_key = f"class_member_stats_{period}_{start_date.date()}_{end_date.date()}"
-        stats = cache.get(cache_key)
-
-        if not stats:
-            stats = []
-
-            # Xác định khoảng thời gian cho mỗi period
-            delta_map = {
-                'weekly': timedelta(days=7),
-                'monthly': timedelta(days=30),
-                'yearly': timedelta(days=365)
+        period = normalize_period(period)
+        return cached_stats(
+            'class_member_stats', ('enrollments', 'classes'),
+            (period, start_date.date(), end_date.date(), class_id, trainer_id),
+            lambda: self.compute_class_member_stats(period, start_date, end_date, class_id, trainer_id)
+        )
+
+    def compute_class_member_stats(self, period, start_date, end_date, class_id=None, trainer_id=None):
+        """
+        Chỉ dùng hai truy vấn: danh sách lớp và số enrollment nhóm theo (lớp, kỳ).
+        """
+        stats = []
+        periods = list(iter_periods(start_date, end_date, period))
+        if not periods:
+            return stats
+        range_start, range_end = day_start(periods[0][0]), day_end(periods[-1][1])
+
+        # Lấy tất cả lớp học active giao với toàn bộ khoảng thời gian
+        classes = Class.objects.filter(
+            active=True,
+            deleted_at__isnull=True,
+            start_time__lte=range_end,
+            end_time__gte=range_start
+        )
+        if class_id:
+            classes = classes.filter(id=class_id)
+        if trainer_id:
+            classes = classes.filter(trainer_id=trainer_id)
+        classes = list(classes.select_related('trainer'))
+
+        # Số enrollment approved của từng lớp, nhóm theo kỳ
+        enrollment_counts = {}
+        rows = Enrollment.objects.filter(
+            gym_class_id__in=[c.id for c in classes],
+            status='approved',
+            created_date__lte=range_end
+        ).annotate(
+            bucket=trunc_period('created_date', period)
+        ).values('gym_class_id', 'bucket').annotate(total=Count('id')).order_by()
+        for row in rows:
+            enrollment_counts.setdefault(row['gym_class_id'], {})[to_date(row['bucket'])] = row['total']
+
+        # Enrollment tạo trước kỳ đầu tiên được cộng sẵn vào sĩ số
+        current_members = {
+            c.id: sum(n for bucket, n in enrollment_counts.get(c.id, {}).items() if bucket < periods[0][0])
+            for c in classes
+        }
+
+        for period_start, period_end in periods:
+            current_date, period_end_dt = day_start(period_start), day_end(period_end)
+
+            period_stats = {
+                'period_start': period_start,
+                'period_end': period_end,
+                'total_classes': 0,
+                'classes': [],
+                'total_new_enrollments': 0,
+                'average_occupancy_rate': 0
             }
-            delta = delta_map.get(period, timedelta(days=30))
-
-            current_date = start_date
-
-            while current_date <= end_date:
-                period_end = min(current_date + delta, end_date)
-
-                # Lấy tất cả lớp học active trong khoảng thời gian này
-                active_classes = Class.objects.filter(
-                    active=True,
-                    deleted_at__isnull=True,
-                    start_time__lte=period_end,
-                    end_time__gte=current_date
-                ).select_related('trainer')
-
-                period_stats = {
-                    'period_start': current_date.date(),
-                    'period_end': period_end.date(),
-                    'total_classes': active_classes.count(),
-                    'classes': [],
-                    'total_new_enrollments': 0,
-                    'average_occupancy_rate': 0
-                }
 
-                total_occupancy = 0
-                valid_classes_count = 0
-
-                for gym_class in active_classes:
-                    # Đếm số enrollment approved hiện tại cho lớp này
-                    current_enrollments = Enrollment.objects.filter(
-                        gym_class=gym_class,
-                        status='approved',
-                        created_date__lte=period_end
-                    ).count()
-
-                    # Đếm số enrollment mới trong khoảng thời gian này
-                    new_enrollments = Enrollment.objects.filter(
-                        gym_class=gym_class,
-                        status='approved',
-                        created_date__range=[current_date, period_end]
-                    ).count()
-
-                    # Tính tỷ lệ lấp đầy
-                    occupancy_rate = 0
-                    if gym_class.max_members > 0:
-                        occupancy_rate = round((current_enrollments / gym_class.max_members) * 100, 2)
-                        total_occupancy += occupancy_rate
-                        valid_classes_count += 1
-
-                    class_data = {
-                        'class_id': gym_class.id,
-                        'class_name': gym_class.name,
-                        'trainer_name': gym_class.trainer.full_name if gym_class.trainer and gym_class.trainer.full_name else "Chưa có huấn luyện viên",
-                        'trainer_id': gym_class.trainer.id if gym_class.trainer else None,
-                        'current_members': current_enrollments,
-                        'max_capacity': gym_class.max_members,
-                        'new_enrollments': new_enrollments,
-                        'occupancy_rate': occupancy_rate,
-                        'status': gym_class.status,
-                        'price': float(gym_class.price) if gym_class.price else 0
-                    }
+            total_occupancy = 0
+            valid_classes_count = 0
+
+            for gym_class in classes:
+                new_enrollments = enrollment_counts.get(gym_class.id, {}).get(period_start, 0)
+                current_members[gym_class.id] += new_enrollments
+
+                if gym_class.start_time > period_end_dt or gym_class.end_time < current_date:
+                    continue
+                current_enrollments = current_members[gym_class.id]
+
+                # Tính tỷ lệ lấp đầy
+                occupancy_rate = 0
+                if gym_class.max_members > 0:
+                    occupancy_rate = round((current_enrollments / gym_class.max_members) * 100, 2)
+                    total_occupancy += occupancy_rate
+                    valid_classes_count += 1
+
+                class_data = {
+                    'class_id': gym_class.id,
+                    'class_name': gym_class.name,
+                    'trainer_name': gym_class.trainer.full_name if gym_class.trainer and gym_class.trainer.full_name else "Chưa có huấn luyện viên",
+                    'trainer_id': gym_class.trainer.id if gym_class.trainer else None,
+                    'current_members': current_enrollments,
+                    'max_capacity': gym_class.max_members,
+                    'new_enrollments': new_enrollments,
+                    'occupancy_rate': occupancy_rate,
+                    'status': gym_class.status,
+                    'price': float(gym_class.price) if gym_class.price else 0
+                }
 
-                    period_stats['classes'].append(class_data)
-                    period_stats['total_new_enrollments'] += new_enrollments
+                period_stats['classes'].append(class_data)
+                period_stats['total_new_enrollments'] += new_enrollments
 
-                # Tính tỷ lệ lấp đầy trung bình
-                if valid_classes_count > 0:
-                    period_stats['average_occupancy_rate'] = round(total_occupancy / valid_classes_count, 2)
+            period_stats['total_classes'] = len(period_stats['classes'])
 
-                # Sắp xếp lớp học theo số lượng hội viên giảm dần
-                period_stats['classes'].sort(key=lambda x: x['current_members'], reverse=True)
+            # Tính tỷ lệ lấp đầy trung bình
+            if valid_classes_count > 0:
+                period_stats['average_occupancy_rate'] = round(total_occupancy / valid_classes_count, 2)
 
-                stats.append(period_stats)
-                current_date += delta
+            # Sắp xếp lớp học theo số lượng hội viên giảm dần
+            period_stats['classes'].sort(key=lambda x: x['current_members'], reverse=True)
 
-            # Cache kết quả trong 1 giờ
-            cache.set(cache_key, stats, timeout=3600)
+            stats.append(period_stats)
 
         return stats
 
@@ -694,7 +1055,7 @@ class StatisticViewSet(viewsets.ModelViewSet):
                     'enrollment_count': cls.enrollment_count,
                     'occupancy_rate': round(
                         (cls.enrollment_count / cls.max_members * 100) if cls.max_members > 0 else 0, 2),
-                    'trainer_name': f"{cls.trainer.first_name} {cls.trainer.last_name}" if cls.trainer else "N/A"
+                    'trainer_name': cls.trainer_name or "N/A"
                 })
 
             # Thống kê theo trạng thái thanh toán
@@ -737,15 +1098,30 @@ class StatisticViewSet(viewsets.ModelViewSet):
             # Lấy tham số từ query
             period = request.query_params.get('period', 'monthly')
             limit = int(request.query_params.get('limit', 10))
-
-            # Thống kê hiệu suất lớp học
+            if period not in ['weekly', 'monthly', 'yearly']:
+                raise ValueError('period must be weekly, monthly, or yearly')
+            since = day_start(period_floor(timezone.now(), period))
+
+            # Mỗi chỉ số là một subquery độc lập để không nhân chéo enrollment × payment
+            enrollments = Enrollment.objects.filter(
+                gym_class=OuterRef('pk'),
+                status='approved',
+                created_date__gte=since
+            ).order_by().values('gym_class').annotate(total=Count('id')).values('total')
+            revenue = Payment.objects.filter(
+                member__enrollment__gym_class=OuterRef('pk'),
+                member__enrollment__status='approved',
+                status='success',
+                date_paid__gte=since
+            ).order_by().values('member__enrollment__gym_class').annotate(total=Sum('amount')).values('total')
+
+            # Thống kê hiệu suất lớp học trong kỳ hiện tại
             classes_performance = Class.objects.filter(
                 active=True,
                 deleted_at__isnull=True
             ).annotate(
-                total_enrollments=Count('enrollment', filter=Q(enrollment__status='approved')),
-                total_revenue=Sum('enrollment__member__payment__amount',
-                                  filter=Q(enrollment__member__payment__status='success')),
+                total_enrollments=Coalesce(Subquery(enrollments, output_field=IntegerField()), 0),
+                total_revenue=Subquery(revenue, output_field=DecimalField(max_digits=12, decimal_places=2)),
                 avg_occupancy=Case(
                     When(max_members__gt=0,
                          then=ExpressionWrapper(
@@ -771,6 +1147,8 @@ class StatisticViewSet(viewsets.ModelViewSet):
 
             return Response({
                 'status': 'success',
+                'period': period,
+                'since': since,
                 'data': performance_data
             })
 